@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Mechanic, ServiceRequest, Review, Payment, Vehicle, Notification
+from .models import User, Mechanic, ServiceRequest, Review, Payment, Vehicle, Notification, GeocodeJob, OutboxEvent
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -69,4 +69,16 @@ class VehicleAdmin(admin.ModelAdmin):
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ['recipient', 'notification_type', 'title', 'read', 'created_at']
     list_filter = ['notification_type', 'read', 'created_at']
-    search_fields = ['recipient__username', 'title', 'message']
\ No newline at end of file
+    search_fields = ['recipient__username', 'title', 'message']
+
+@admin.register(GeocodeJob)
+class GeocodeJobAdmin(admin.ModelAdmin):
+    list_display = ['target_type', 'target_id', 'status', 'attempts', 'next_attempt_at']
+    list_filter = ['target_type', 'status']
+    search_fields = ['address']
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['event_type', 'status', 'attempts', 'next_attempt_at', 'created_at', 'processed_at']
+    list_filter = ['event_type', 'status']
+    search_fields = ['last_error']
@@ -5,6 +5,8 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
+        # Connect the model signal receivers
+        import core.signals # noqa: F401
         # Import template tags when the app is ready
         from django.template.defaulttags import register
         try:
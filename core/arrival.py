@@ -0,0 +1,63 @@
+"""
+Arrival detection for assigned mechanics.
+
+Each location flush checks the new fixes against a geofence of ARRIVAL_RADIUS_M around the
+active service requests of the same mechanics, with one query for the whole flush. The first fix
+inside the geofence stamps arrived_at (moving an ACCEPTED request to IN_PROGRESS if the mechanic
+never pressed start) and queues a notification for the user. The stamp is a conditional update, so the event
+fires exactly once even when several workers flush the same mechanic.
+"""
+from django.conf import settings
+from django.db.models import Case, CharField, F, Value, When
+from django.utils import timezone
+
+from . import outbox
+from .distance import elementwise_haversine_km
+from .models import ServiceRequest
+
+DEFAULT_ARRIVAL_RADIUS_M = 150.0
+ARRIVAL_STATUSES = ['ACCEPTED', 'IN_PROGRESS']
+
+
+def arrival_radius_km():
+    return float(getattr(settings, 'ARRIVAL_RADIUS_M', DEFAULT_ARRIVAL_RADIUS_M)) / 1000
+
+
+def mark_arrived(service_request_id, arrived_at):
+    """Stamps arrived_at unless it is already set. Returns True for the call that stamped it."""
+    return ServiceRequest.objects.filter(id=service_request_id, arrived_at__isnull=True).update(
+        arrived_at=arrived_at,
+        status=Case(When(status='ACCEPTED', then=Value('IN_PROGRESS')), default=F('status'), output_field=CharField()),
+        updated_at=timezone.now(),
+    ) == 1
+
+
+def detect_arrivals(positions):
+    """
+    Checks {mechanic_id: (latitude, longitude, recorded_at)} against the mechanics' active
+    service requests. Returns the ids of the requests that were marked arrived.
+    """
+    if not positions:
+        return []
+    waiting = list(
+        ServiceRequest.objects.filter(
+            mechanic_id__in=list(positions), status__in=ARRIVAL_STATUSES, arrived_at__isnull=True,
+            latitude__isnull=False, longitude__isnull=False,
+        ).values_list('id', 'mechanic_id', 'latitude', 'longitude')
+    )
+    if not waiting:
+        return []
+    fixes = [positions[mechanic_id] for _, mechanic_id, _, _ in waiting]
+    distances = elementwise_haversine_km(
+        [row[2] for row in waiting], [row[3] for row in waiting],
+        [fix[0] for fix in fixes], [fix[1] for fix in fixes],
+    )
+
+    radius_km = arrival_radius_km()
+    arrived = []
+    for (request_id, _, _, _), fix, distance in zip(waiting, fixes, distances):
+        if distance <= radius_km and mark_arrived(request_id, fix[2]):
+            arrived.append(request_id)
+    for service_request in ServiceRequest.objects.filter(id__in=arrived).select_related('user'):
+        outbox.notify('mechanic_arrived', service_request.user, service_request=service_request)
+    return arrived
@@ -0,0 +1,20 @@
+"""
+Opaque keyset-pagination cursors: a (timestamp, id) position encoded as URL-safe base64.
+"""
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+def encode_cursor(timestamp, row_id):
+    return urlsafe_base64_encode(f"{timestamp.isoformat()}|{row_id}".encode())
+
+
+def decode_cursor(value):
+    """Returns (timestamp, id), or None for an empty cursor. Raises ValueError when malformed."""
+    if not value:
+        return None
+    timestamp, row_id = urlsafe_base64_decode(value).decode().split('|')
+    parsed = parse_datetime(timestamp)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed, int(row_id)
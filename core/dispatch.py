@@ -0,0 +1,204 @@
+"""
+Batch dispatcher that assigns pending service requests to available mechanics.
+
+Each tick collects every unassigned PENDING request and every idle available mechanic and solves
+one min-cost bipartite matching over (distance, rating, specialization). Only mechanics within
+DISPATCH_RADIUS_KM of a request, and at most CANDIDATES_PER_REQUEST of them, become edges, so the
+problem stays sparse and thousands of requests can be matched per tick.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, When, Value
+from django.utils import timezone
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+from . import outbox
+from .distance import pairwise_haversine_km
+from .geo import CELL_SIZE_DEG, KM_PER_DEGREE, cell_for, cell_index, cells_within
+from .models import Mechanic, Notification, ServiceRequest
+
+DISPATCH_RADIUS_KM = 25
+CANDIDATES_PER_REQUEST = 8
+MAX_REQUESTS_PER_TICK = 5000
+# Requests per distance-matrix block, bounds memory for very dense cells
+REQUEST_BLOCK_SIZE = 500
+
+# Cost weights, expressed in "km of extra driving"
+DISTANCE_WEIGHT = 1.0
+RATING_WEIGHT = 2.0 # per missing star below 5
+SPECIALIZATION_PENALTY = 10.0
+# Cost of leaving a request unassigned this tick; larger than any real edge
+UNASSIGNED_COST = 1e6
+
+
+def specialization_matches(specialization, vehicle_type):
+    return bool(vehicle_type) and vehicle_type.strip().lower() in (specialization or '').lower()
+
+
+def candidate_edges(requests, mechanics, radius_km=DISPATCH_RADIUS_KM, per_request=CANDIDATES_PER_REQUEST):
+    """
+    Returns (request_index, mechanic_index, km) arrays linking each request to its nearest mechanics.
+    Requests are processed per grid cell, so each block of distances is one vectorized computation.
+    """
+    mechanic_lats = np.array([m['lat'] for m in mechanics], dtype=np.float64)
+    mechanic_lngs = np.array([m['lng'] for m in mechanics], dtype=np.float64)
+    mechanics_by_cell = defaultdict(list)
+    for index, mechanic in enumerate(mechanics):
+        mechanics_by_cell[cell_for(mechanic['lat'], mechanic['lng'])].append(index)
+    requests_by_cell = defaultdict(list)
+    for index, service_request in enumerate(requests):
+        requests_by_cell[cell_index(service_request['lat'], service_request['lng'])].append(index)
+
+    rows, cols, distances = [], [], []
+    for (row, col), request_indexes in requests_by_cell.items():
+        # Cover the radius around every point of this cell, not just around its centre
+        centre_lat = (row + 0.5) * CELL_SIZE_DEG
+        centre_lng = (col + 0.5) * CELL_SIZE_DEG
+        nearby = [
+            index
+            for cell in cells_within(centre_lat, centre_lng, radius_km + CELL_SIZE_DEG * KM_PER_DEGREE)
+            for index in mechanics_by_cell.get(cell, ())
+        ]
+        if not nearby:
+            continue
+        nearby = np.array(nearby)
+
+        for start in range(0, len(request_indexes), REQUEST_BLOCK_SIZE):
+            block = np.array(request_indexes[start:start + REQUEST_BLOCK_SIZE])
+            km = pairwise_haversine_km(
+                [requests[i]['lat'] for i in block], [requests[i]['lng'] for i in block],
+                mechanic_lats[nearby], mechanic_lngs[nearby],
+            )
+            km[km > radius_km] = np.inf
+            keep = min(per_request, km.shape[1])
+            if keep < km.shape[1]:
+                nearest = np.argpartition(km, keep - 1, axis=1)[:, :keep]
+            else:
+                nearest = np.broadcast_to(np.arange(keep), km.shape)
+            nearest_km = np.take_along_axis(km, nearest, axis=1)
+            in_range = np.isfinite(nearest_km)
+            rows.append(np.broadcast_to(block[:, None], nearest.shape)[in_range])
+            cols.append(nearby[nearest][in_range])
+            distances.append(nearest_km[in_range])
+
+    if not rows:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.float64)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(distances)
+
+
+def solve(requests, mechanics, radius_km=DISPATCH_RADIUS_KM, per_request=CANDIDATES_PER_REQUEST):
+    """
+    Computes the min-cost assignment of requests to mechanics.
+
+    requests: dicts with 'id', 'lat', 'lng', 'vehicle_type'.
+    mechanics: dicts with 'id', 'lat', 'lng', 'rating', 'specialization'.
+    Returns a list of (request_id, mechanic_id, km) tuples; requests with no mechanic in range are left out.
+    """
+    if not requests or not mechanics:
+        return []
+    rows, cols, km = candidate_edges(requests, mechanics, radius_km, per_request)
+    if len(rows) == 0:
+        return []
+
+    ratings = np.array([float(m['rating'] or 0) for m in mechanics])
+    mismatched = np.array([
+        not specialization_matches(mechanics[col]['specialization'], requests[row]['vehicle_type'])
+        for row, col in zip(rows, cols)
+    ])
+    # Costs are kept strictly positive because the sparse solver treats zero weights as missing edges
+    costs = (
+        DISTANCE_WEIGHT * km
+        + RATING_WEIGHT * np.clip(5.0 - ratings[cols], 0.0, 5.0)
+        + SPECIALIZATION_PENALTY * mismatched
+        + 1.0
+    )
+
+    # One private "unassigned" column per request guarantees that a full matching exists
+    request_count = len(requests)
+    dummy_rows = np.arange(request_count)
+    dummy_cols = len(mechanics) + dummy_rows
+    graph = coo_matrix(
+        (
+            np.concatenate([costs, np.full(request_count, UNASSIGNED_COST)]),
+            (np.concatenate([rows, dummy_rows]), np.concatenate([cols, dummy_cols])),
+        ),
+        shape=(request_count, len(mechanics) + request_count),
+    ).tocsr()
+    matched_rows, matched_cols = min_weight_full_bipartite_matching(graph)
+
+    edge_km = {(row, col): distance for row, col, distance in zip(rows.tolist(), cols.tolist(), km.tolist())}
+    return [
+        (requests[row]['id'], mechanics[col]['id'], edge_km[(row, col)])
+        for row, col in zip(matched_rows.tolist(), matched_cols.tolist())
+        if col < len(mechanics)
+    ]
+
+
+def run_tick():
+    """Assigns pending requests in bulk. Returns the list of (request_id, mechanic_id, km) applied."""
+    requests = [
+        {'id': sr['id'], 'lat': sr['latitude'], 'lng': sr['longitude'], 'vehicle_type': sr['vehicle_type']}
+        for sr in ServiceRequest.objects.filter(
+            status='PENDING', mechanic__isnull=True, latitude__isnull=False, longitude__isnull=False
+        ).order_by('created_at').values('id', 'latitude', 'longitude', 'vehicle_type')[:MAX_REQUESTS_PER_TICK]
+    ]
+    if not requests:
+        return []
+
+    # Mechanics that already hold an open request are not offered another one
+    busy_mechanic_ids = ServiceRequest.objects.filter(
+        mechanic__isnull=False, status__in=['PENDING', 'ACCEPTED', 'IN_PROGRESS']
+    ).values('mechanic_id')
+    mechanics = [
+        {
+            'id': m['id'], 'lat': m['latitude'], 'lng': m['longitude'],
+            'rating': m['rating'], 'specialization': m['specialization'], 'user_id': m['user_id'],
+        }
+        for m in Mechanic.objects.filter(
+            available=True, latitude__isnull=False, longitude__isnull=False
+        ).exclude(id__in=busy_mechanic_ids).values('id', 'latitude', 'longitude', 'rating', 'specialization', 'user_id')
+    ]
+
+    assignments = solve(requests, mechanics)
+    if not assignments:
+        return []
+
+    assigned_mechanics = {request_id: mechanic_id for request_id, mechanic_id, _ in assignments}
+    with transaction.atomic():
+        # Requests picked up manually since the snapshot was taken are skipped
+        still_pending = set(
+            ServiceRequest.objects.select_for_update(skip_locked=True)
+            .filter(id__in=list(assigned_mechanics), status='PENDING', mechanic__isnull=True)
+            .values_list('id', flat=True)
+        )
+        applied = [assignment for assignment in assignments if assignment[0] in still_pending]
+        if not applied:
+            return []
+        ServiceRequest.objects.filter(id__in=still_pending).update(
+            mechanic_id=Case(*[When(id=request_id, then=Value(mechanic_id)) for request_id, mechanic_id, _ in applied]),
+            updated_at=timezone.now(),
+        )
+
+        mechanic_user_ids = {m['id']: m['user_id'] for m in mechanics}
+        request_user_ids = dict(ServiceRequest.objects.filter(id__in=still_pending).values_list('id', 'user_id'))
+        notifications = []
+        for request_id, mechanic_id, distance in applied:
+            notifications.append(Notification(
+                recipient_id=mechanic_user_ids[mechanic_id],
+                notification_type='SERVICE_REQUEST',
+                title="New Request Received",
+                message=f"A service request {round(distance, 1)} km from you has been assigned to you. Please review it.",
+            ))
+            notifications.append(Notification(
+                recipient_id=request_user_ids[request_id],
+                notification_type='STATUS_UPDATE',
+                title="Mechanic Assigned",
+                message="A nearby mechanic has been notified about your request. They will review it shortly.",
+            ))
+        Notification.bulk_create_notifications(notifications, batch_size=500)
+        outbox.push_notifications(notifications)
+    return applied
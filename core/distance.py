@@ -0,0 +1,58 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distances in km from one point to arrays of points, in a single vectorized pass."""
+    lat1 = np.radians(float(lat))
+    lng1 = np.radians(float(lng))
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    lng2 = np.radians(np.asarray(lngs, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def pairwise_haversine_km(lats_a, lngs_a, lats_b, lngs_b):
+    """Distance matrix in km between two sets of points, shape (len(a), len(b))."""
+    lat1 = np.radians(np.asarray(lats_a, dtype=np.float64))[:, None]
+    lng1 = np.radians(np.asarray(lngs_a, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(lats_b, dtype=np.float64))[None, :]
+    lng2 = np.radians(np.asarray(lngs_b, dtype=np.float64))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def elementwise_haversine_km(lats_a, lngs_a, lats_b, lngs_b):
+    """Distances in km between a[i] and b[i] for equally sized arrays of points."""
+    lat1 = np.radians(np.asarray(lats_a, dtype=np.float64))
+    lng1 = np.radians(np.asarray(lngs_a, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lats_b, dtype=np.float64))
+    lng2 = np.radians(np.asarray(lngs_b, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def rank_by_distance(lat, lng, points, max_km=None, limit=None):
+    """
+    Ranks (id, latitude, longitude) points by distance from (lat, lng).
+    Returns a list of (id, km) pairs sorted nearest first, optionally cut at max_km and limit.
+    """
+    points = list(points)
+    if not points:
+        return []
+    ids = np.array([p[0] for p in points])
+    distances = haversine_km(lat, lng, [p[1] for p in points], [p[2] for p in points])
+
+    if max_km is not None:
+        in_range = distances <= max_km
+        ids = ids[in_range]
+        distances = distances[in_range]
+
+    if limit is not None and limit < len(distances):
+        # Partial sort: only the nearest `limit` entries need ordering
+        nearest = np.argpartition(distances, limit)[:limit]
+        order = nearest[np.argsort(distances[nearest], kind='stable')]
+    else:
+        order = np.argsort(distances, kind='stable')
+    return [(ids[i].item(), float(distances[i])) for i in order]
@@ -0,0 +1,70 @@
+"""
+Emails sent by the outbox worker (see core.outbox) rather than from request handlers.
+"""
+import io
+import textwrap
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+
+def send_payment_receipt_email(payment):
+    """Emails the user a receipt with the PDF attached. Errors propagate so the outbox retries."""
+    service_request = payment.service_request
+    receipt_url = settings.BASE_URL + reverse('core:payment_receipt', args=[payment.id]) # Assuming BASE_URL is set in settings
+
+    subject = f"MechResQ Payment Receipt for Service Request #{service_request.id}"
+    html_message = render_to_string('emails/payment_receipt_email.html', {
+        'payment': payment,
+        'service_request': service_request,
+        'receipt_url': receipt_url,
+        'base_url': settings.BASE_URL,
+        'current_year': timezone.now().year,
+    })
+    plain_message = f"""
+    Dear {service_request.user.username},
+
+    Thank you for using MechResQ! Your payment for service request #{service_request.id} has been successfully processed.
+
+    Payment Details:
+    Service Request ID: {service_request.id}
+    Mechanic: {service_request.mechanic.user.get_full_name() if service_request.mechanic else 'N/A'}
+    Vehicle: {service_request.vehicle.make if service_request.vehicle else 'N/A'} {service_request.vehicle.model if service_request.vehicle else ''} ({service_request.vehicle.license_plate if service_request.vehicle else ''})
+    Issue: {service_request.issue_description}
+    Service Charge: Rs.{payment.service_charge}
+    Tax (18% GST): Rs.{payment.tax}
+    Total Amount Paid: Rs.{payment.total_amount}
+    Payment Method: {payment.get_payment_method_display()}
+    Transaction ID: {payment.transaction_id}
+    Paid At: {payment.paid_at}
+
+    You can view your full receipt here: {receipt_url}
+
+    Thank you,
+    The MechResQ Team
+    """
+    
+    email = EmailMultiAlternatives(
+        subject,
+        textwrap.dedent(plain_message).strip(),
+        settings.DEFAULT_FROM_EMAIL,
+        [service_request.user.email],
+    )
+    email.attach_alternative(html_message, "text/html")
+    pdf_html = render_to_string('service/payment_receipt_pdf.html', {
+        'payment': payment,
+        'service_request': service_request,
+        'base_url': settings.BASE_URL,
+        'current_year': timezone.now().year,
+    })
+    pdf_buffer = io.BytesIO()
+    pisa.CreatePDF(pdf_html, dest=pdf_buffer)
+    pdf_data = pdf_buffer.getvalue()
+    pdf_buffer.close()
+    email.attach(f"payment_receipt_{payment.id}.pdf", pdf_data, 'application/pdf')
+    email.send()
+    return True
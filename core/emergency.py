@@ -0,0 +1,84 @@
+"""
+Ring-based fan-out for emergency (SOS) requests.
+
+The SOS view only writes the EmergencyRequest row with next_escalation_at set to now. The
+escalate_emergencies command then alerts the nearest RING_SIZE available mechanics and, while
+nobody has accepted, alerts the next nearest ring every ESCALATION_SECONDS.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import registry as mechanic_registry
+from . import outbox, ranking
+from .matching import RANKING_POOL_FACTOR, nearest_mechanics
+from .models import EmergencyRequest, Notification
+
+RING_SIZE = 5
+ESCALATION_SECONDS = 60
+MAX_RADIUS_KM = 50
+# Stop widening the search for requests nobody has accepted after this long
+MAX_ESCALATION_AGE = timedelta(minutes=30)
+
+
+def escalate(emergency_request):
+    """Alerts the next ring of mechanics for one emergency request. Returns the number alerted."""
+    now = timezone.now()
+    notified_ids = set(emergency_request.notified_mechanics.values_list('id', flat=True))
+    ranked, _ = nearest_mechanics(
+        emergency_request.latitude, emergency_request.longitude,
+        k=len(notified_ids) + RING_SIZE * RANKING_POOL_FACTOR, max_km=MAX_RADIUS_KM, available_only=True
+    )
+    # The best-scored mechanics among the nearest not yet alerted form the next ring
+    pool = [(mechanic_id, distance) for mechanic_id, distance in ranked if mechanic_id not in notified_ids]
+    entries = mechanic_registry.get_entries([mechanic_id for mechanic_id, _ in pool])
+    next_ring = ranking.rank_candidates(pool, entries, limit=RING_SIZE)
+
+    username = emergency_request.user.username
+    notifications = [
+        Notification(
+            recipient_id=entries[mechanic_id]['user_id'],
+            notification_type='EMERGENCY',
+            title=f"New Emergency Request from {username}",
+            message=f"An emergency request has been placed at {emergency_request.latitude}, {emergency_request.longitude}. Distance: {round(distance, 2)} km."
+        )
+        for mechanic_id, distance in next_ring
+    ]
+    # The view schedules the first round at creation time; later rounds are ESCALATION_SECONDS apart
+    first_round = emergency_request.next_escalation_at - emergency_request.created_at < timedelta(seconds=ESCALATION_SECONDS)
+    if first_round and not next_ring:
+        # Notify user if no mechanics are found
+        notifications.append(Notification(
+            recipient=emergency_request.user,
+            notification_type='STATUS_UPDATE',
+            title="Emergency Request Received",
+            message="Your emergency request has been received, but no nearby mechanics are currently available. We are expanding our search."
+        ))
+
+    with transaction.atomic():
+        Notification.bulk_create_notifications(notifications)
+        outbox.push_notifications(notifications)
+        emergency_request.notified_mechanics.add(*[mechanic_id for mechanic_id, _ in next_ring])
+        if now - emergency_request.created_at >= MAX_ESCALATION_AGE:
+            emergency_request.next_escalation_at = None
+        else:
+            emergency_request.next_escalation_at = now + timedelta(seconds=ESCALATION_SECONDS)
+        EmergencyRequest.objects.filter(pk=emergency_request.pk).update(next_escalation_at=emergency_request.next_escalation_at)
+    return len(next_ring)
+
+
+def run_due_escalations():
+    """Escalates every pending emergency request whose deadline has passed. Returns how many were processed."""
+    now = timezone.now()
+    due = EmergencyRequest.objects.filter(status='PENDING', next_escalation_at__lte=now).select_related('user')
+    processed = 0
+    for emergency_request in due:
+        # Claim the request so concurrent schedulers do not alert the same ring twice
+        claimed = EmergencyRequest.objects.filter(
+            pk=emergency_request.pk, status='PENDING', next_escalation_at=emergency_request.next_escalation_at
+        ).update(next_escalation_at=now + timedelta(seconds=ESCALATION_SECONDS))
+        if claimed:
+            escalate(emergency_request)
+            processed += 1
+    return processed
@@ -0,0 +1,169 @@
+"""
+Offline ETA estimates from a speed-zone grid.
+
+The grid is an .npz file built by the build_speed_grid command from LocationHistory traces. It
+holds the typical travel speed per small grid cell. An ETA is the straight-line route sampled
+every few hundred metres, with each sample's cell speed looked up in one vectorized pass, scaled
+by a road detour factor. Cells without data fall back to DEFAULT_SPEED_KMH.
+"""
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .distance import elementwise_haversine_km
+
+# Speed cells are finer than the matching grid so city and highway speeds are told apart
+SPEED_CELL_SIZE_DEG = 0.02
+DEFAULT_SPEED_KMH = 25.0
+MIN_SPEED_KMH = 5.0
+# Roads are longer than the straight line between two points
+ROAD_DETOUR_FACTOR = 1.3
+SAMPLES_PER_KM = 2
+MAX_SAMPLES = 64
+
+# Filters applied to consecutive LocationHistory fixes when building the grid
+MIN_SEGMENT_SECONDS = 5
+MAX_SEGMENT_SECONDS = 600
+MIN_MOVING_SPEED_KMH = 3.0 # slower segments are a parked mechanic, not traffic
+MAX_PLAUSIBLE_SPEED_KMH = 140.0 # faster segments are GPS jumps
+MIN_CELL_SAMPLES = 3
+
+_lock = threading.Lock()
+_grid = None
+
+
+class SpeedGrid:
+    def __init__(self, keys, speeds, cell_size=SPEED_CELL_SIZE_DEG):
+        order = np.argsort(keys)
+        self.keys = np.asarray(keys, dtype=np.int64)[order]
+        self.speeds = np.asarray(speeds, dtype=np.float64)[order]
+        self.cell_size = float(cell_size)
+
+    def cell_keys(self, lats, lngs):
+        rows = np.floor(np.asarray(lats, dtype=np.float64) / self.cell_size).astype(np.int64)
+        cols = np.floor(np.asarray(lngs, dtype=np.float64) / self.cell_size).astype(np.int64)
+        return encode_cells(rows, cols)
+
+    def speeds_at(self, lats, lngs):
+        """Speed in km/h at every point; points in unknown cells get DEFAULT_SPEED_KMH."""
+        keys = self.cell_keys(lats, lngs)
+        if not len(self.keys):
+            return np.full(keys.shape, DEFAULT_SPEED_KMH)
+        positions = np.clip(np.searchsorted(self.keys, keys), 0, len(self.keys) - 1)
+        return np.where(self.keys[positions] == keys, self.speeds[positions], DEFAULT_SPEED_KMH)
+
+
+def encode_cells(rows, cols):
+    # Rows and cols stay well inside +-2**20 for 0.02 degree cells, so both fit in one int64
+    return (np.asarray(rows, dtype=np.int64) << 32) + (np.asarray(cols, dtype=np.int64) + (1 << 31))
+
+
+def grid_path():
+    return getattr(settings, 'ETA_SPEED_GRID_PATH', os.path.join(settings.BASE_DIR, 'data', 'speed_grid.npz'))
+
+
+def save_grid(path, keys, speeds, cell_size=SPEED_CELL_SIZE_DEG):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez_compressed(path, keys=np.asarray(keys, dtype=np.int64), speeds=np.asarray(speeds, dtype=np.float64), cell_size=cell_size)
+
+
+def load_grid(path=None):
+    """Loads the speed grid file, or an empty grid when it has not been built yet."""
+    path = path or grid_path()
+    if not os.path.exists(path):
+        return SpeedGrid([], [])
+    with np.load(path) as data:
+        return SpeedGrid(data['keys'], data['speeds'], data['cell_size'])
+
+
+def get_grid():
+    global _grid
+    if _grid is None:
+        with _lock:
+            if _grid is None:
+                _grid = load_grid()
+    return _grid
+
+
+def reset_grid():
+    """Drops the loaded grid so the next ETA picks up a rebuilt file."""
+    global _grid
+    with _lock:
+        _grid = None
+
+
+def speeds_from_traces(mechanic_ids, lats, lngs, seconds, cell_size=SPEED_CELL_SIZE_DEG, min_samples=MIN_CELL_SAMPLES):
+    """
+    Builds (keys, speeds) for a grid from location fixes sorted by mechanic and time.
+    Each cell gets the median speed of the moving segments whose midpoint falls inside it.
+    """
+    mechanic_ids = np.asarray(mechanic_ids)
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    seconds = np.asarray(seconds, dtype=np.float64)
+    if len(lats) < 2:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+    same_mechanic = mechanic_ids[1:] == mechanic_ids[:-1]
+    elapsed = seconds[1:] - seconds[:-1]
+    km = elementwise_haversine_km(lats[:-1], lngs[:-1], lats[1:], lngs[1:])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speeds = km / (elapsed / 3600)
+    valid = (
+        same_mechanic
+        & (elapsed >= MIN_SEGMENT_SECONDS) & (elapsed <= MAX_SEGMENT_SECONDS)
+        & (speeds >= MIN_MOVING_SPEED_KMH) & (speeds <= MAX_PLAUSIBLE_SPEED_KMH)
+    )
+    mid_lats = ((lats[1:] + lats[:-1]) / 2)[valid]
+    mid_lngs = ((lngs[1:] + lngs[:-1]) / 2)[valid]
+    speeds = speeds[valid]
+    keys = encode_cells(np.floor(mid_lats / cell_size).astype(np.int64), np.floor(mid_lngs / cell_size).astype(np.int64))
+
+    # Sort by cell then speed so every cell's median sits in the middle of its run
+    order = np.lexsort((speeds, keys))
+    keys = keys[order]
+    speeds = speeds[order]
+    cells, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    enough = counts >= min_samples
+    medians = speeds[starts + counts // 2]
+    return cells[enough], medians[enough]
+
+
+def eta_minutes(lat, lng, lats, lngs, grid=None):
+    """Estimated driving minutes from each (lats[i], lngs[i]) to (lat, lng), as a numpy array."""
+    lats = np.asarray(lats, dtype=np.float64)
+    return route_eta_minutes(lats, lngs, np.full(lats.shape, float(lat)), np.full(lats.shape, float(lng)), grid=grid)
+
+
+def route_eta_minutes(from_lats, from_lngs, to_lats, to_lngs, grid=None):
+    """Estimated driving minutes from each (from_lats[i], from_lngs[i]) to (to_lats[i], to_lngs[i])."""
+    grid = grid or get_grid()
+    lats = np.asarray(from_lats, dtype=np.float64)
+    lngs = np.asarray(from_lngs, dtype=np.float64)
+    to_lats = np.asarray(to_lats, dtype=np.float64)
+    to_lngs = np.asarray(to_lngs, dtype=np.float64)
+    if not len(lats):
+        return np.array([], dtype=np.float64)
+    km = elementwise_haversine_km(lats, lngs, to_lats, to_lngs)
+
+    # Sample every route at the same fractions so all routes are looked up in one (n, samples) array
+    samples = int(min(max(np.ceil(km.max() * SAMPLES_PER_KM), 1), MAX_SAMPLES))
+    fractions = (np.arange(samples) + 0.5) / samples
+    sample_lats = lats[:, None] + (to_lats - lats)[:, None] * fractions[None, :]
+    sample_lngs = lngs[:, None] + (to_lngs - lngs)[:, None] * fractions[None, :]
+    speeds = np.maximum(grid.speeds_at(sample_lats, sample_lngs), MIN_SPEED_KMH)
+
+    # Each sample covers an equal share of the route, so hours add up as distance / speed per share
+    hours = (km * ROAD_DETOUR_FACTOR)[:, None] / samples / speeds
+    return hours.sum(axis=1) * 60
+
+
+def eta_for_mechanics(lat, lng, entries):
+    """Returns {mechanic_id: minutes} for registry entries (dicts with 'id', 'lat', 'lng')."""
+    entries = list(entries)
+    minutes = eta_minutes(lat, lng, [entry['lat'] for entry in entries], [entry['lng'] for entry in entries])
+    return {entry['id']: float(value) for entry, value in zip(entries, minutes)}
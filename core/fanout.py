@@ -0,0 +1,50 @@
+"""
+Targeted fan-out of new service requests to mechanics.
+
+A new request is offered only to the best-placed available mechanics near it (the same
+ranking the nearby-mechanics page uses, which favours mechanics covering its vehicle type).
+At most FANOUT_LIMIT notifications are written, in bulk, so the cost of creating a request does
+not grow with the size of the fleet. A request without coordinates is not offered to anyone
+until geocoding fills them in (see core.geocoding.apply_coordinates), which then fans it out.
+"""
+import logging
+
+from django.db import transaction
+
+from . import matching, outbox, ranking
+from .models import Mechanic, Notification
+
+logger = logging.getLogger(__name__)
+
+FANOUT_LIMIT = 50
+FANOUT_RADIUS_KM = 25
+BULK_BATCH_SIZE = 500
+
+
+def target_mechanic_user_ids(service_request):
+    """User ids of the mechanics a new service request with coordinates should be offered to."""
+    vehicle_type = (service_request.vehicle_type or '').strip().upper()
+    if vehicle_type not in ranking.VEHICLE_TYPE_BITS:
+        logger.warning(
+            "Service request %s has unknown vehicle type %r; offering it by distance and score only.",
+            service_request.id, service_request.vehicle_type,
+        )
+    ranked = matching.best_mechanics(
+        service_request.latitude, service_request.longitude, k=FANOUT_LIMIT,
+        vehicle_type=vehicle_type, max_km=FANOUT_RADIUS_KM, available_only=True,
+    )
+    mechanic_ids = [mechanic_id for mechanic_id, _ in ranked]
+    return list(Mechanic.objects.filter(id__in=mechanic_ids).values_list('user_id', flat=True))
+
+
+def notify_mechanics(service_request):
+    """Notifies the targeted mechanics of a new request. Returns how many were notified."""
+    if service_request.latitude is None or service_request.longitude is None:
+        logger.info("Service request %s has no coordinates yet; fan-out waits for geocoding.", service_request.id)
+        return 0
+    user_ids = target_mechanic_user_ids(service_request)
+    with transaction.atomic():
+        notifications = Notification.bulk_create_service_request_notifications(user_ids, service_request, batch_size=BULK_BATCH_SIZE)
+        # One push event for all of them, so the offer reaches their devices in a few multicasts
+        outbox.push_notifications(notifications)
+    return len(user_ids)
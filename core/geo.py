@@ -0,0 +1,44 @@
+from math import floor, cos, radians
+
+# Size of one grid cell in degrees. 0.2 degrees is roughly 22 km of latitude,
+# so a 50 km radius query only has to look at a handful of cells.
+CELL_SIZE_DEG = 0.2
+KM_PER_DEGREE = 111.32
+
+
+def cell_index(lat, lng):
+    """Returns the (row, col) grid index that contains the given point."""
+    return int(floor(float(lat) / CELL_SIZE_DEG)), int(floor(float(lng) / CELL_SIZE_DEG))
+
+
+def cell_key(row, col):
+    return f"{row}:{col}"
+
+
+def cell_for(lat, lng):
+    """Returns the geocell key for a point, or '' when coordinates are missing."""
+    if lat is None or lng is None:
+        return ''
+    return cell_key(*cell_index(lat, lng))
+
+
+def cell_range(lat, lng, radius_km):
+    """Returns the (row_min, row_max, col_min, col_max) indices covering a radius around a point."""
+    lat = float(lat)
+    lng = float(lng)
+    lat_span = radius_km / KM_PER_DEGREE
+    # Longitude degrees shrink towards the poles; clamp to avoid dividing by ~0
+    lng_span = radius_km / (KM_PER_DEGREE * max(cos(radians(lat)), 0.01))
+    row_min, col_min = cell_index(max(lat - lat_span, -90.0), lng - lng_span)
+    row_max, col_max = cell_index(min(lat + lat_span, 90.0), lng + lng_span)
+    return row_min, row_max, col_min, col_max
+
+
+def cells_within(lat, lng, radius_km):
+    """Returns the keys of every cell that may contain points within radius_km of (lat, lng)."""
+    row_min, row_max, col_min, col_max = cell_range(lat, lng, radius_km)
+    return [
+        cell_key(row, col)
+        for row in range(row_min, row_max + 1)
+        for col in range(col_min, col_max + 1)
+    ]
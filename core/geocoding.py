@@ -0,0 +1,146 @@
+"""
+Background geocoding for mechanic workshops and service request locations.
+
+Request handlers only look at the persistent GeocodeCache and enqueue a GeocodeJob on a miss;
+the geocode_worker management command drains the queue and talks to Nominatim.
+"""
+import hashlib
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from geopy.geocoders import Nominatim
+
+from . import fanout
+from . import registry as mechanic_registry
+from .models import GeocodeCache, GeocodeJob, Mechanic, ServiceRequest
+
+MAX_ATTEMPTS = 5
+GEOCODER_TIMEOUT = 5
+# Nominatim's usage policy allows at most one request per second
+GEOCODER_MIN_INTERVAL = 1.0
+
+
+def normalize_address(address):
+    return ' '.join((address or '').lower().split())
+
+
+def address_key(address):
+    return hashlib.sha256(normalize_address(address).encode('utf-8')).hexdigest()
+
+
+def cached_coordinates(address):
+    """Returns (latitude, longitude) from the geocode cache, or None if unknown or not found."""
+    entry = GeocodeCache.objects.filter(address_key=address_key(address)).first()
+    if entry and entry.latitude is not None and entry.longitude is not None:
+        return entry.latitude, entry.longitude
+    return None
+
+
+def apply_coordinates(target_type, target_id, latitude, longitude):
+    if target_type == 'MECHANIC':
+        mechanic = Mechanic.objects.filter(
+            Q(latitude__isnull=True) | Q(longitude__isnull=True), pk=target_id
+        ).first()
+        if mechanic:
+            mechanic.latitude = latitude
+            mechanic.longitude = longitude
+            mechanic.save(update_fields=['latitude', 'longitude'])
+            mechanic_registry.publish(mechanic)
+    elif target_type == 'SERVICE_REQUEST':
+        updated = ServiceRequest.objects.filter(
+            Q(latitude__isnull=True) | Q(longitude__isnull=True), pk=target_id
+        ).update(latitude=latitude, longitude=longitude)
+        service_request = updated and ServiceRequest.objects.filter(pk=target_id, status='PENDING', mechanic__isnull=True).first()
+        if service_request:
+            # Its fan-out was deferred until it had coordinates
+            transaction.on_commit(lambda: fanout.notify_mechanics(service_request))
+
+
+def enqueue(target_type, target_id, address):
+    """Fills coordinates straight from the cache when possible, otherwise queues a geocoding job."""
+    if not normalize_address(address):
+        return None
+    coordinates = cached_coordinates(address)
+    if coordinates:
+        apply_coordinates(target_type, target_id, *coordinates)
+        return None
+    job, _ = GeocodeJob.objects.get_or_create(
+        target_type=target_type, target_id=target_id, status='PENDING',
+        defaults={'address': address}
+    )
+    return job
+
+
+def enqueue_mechanic(mechanic):
+    if mechanic.latitude is None or mechanic.longitude is None:
+        return enqueue('MECHANIC', mechanic.id, mechanic.workshop_address)
+    return None
+
+
+def enqueue_service_request(service_request):
+    if service_request.latitude is None or service_request.longitude is None:
+        return enqueue('SERVICE_REQUEST', service_request.id, service_request.location)
+    return None
+
+
+def enqueue_missing():
+    """Queues every mechanic and service request that still has no coordinates. Returns the count."""
+    missing = Q(latitude__isnull=True) | Q(longitude__isnull=True)
+    queued = 0
+    for mechanic in Mechanic.objects.filter(missing).exclude(workshop_address=''):
+        queued += enqueue_mechanic(mechanic) is not None
+    for service_request in ServiceRequest.objects.filter(missing).exclude(location=''):
+        queued += enqueue_service_request(service_request) is not None
+    return queued
+
+
+def process_jobs(batch_size=20, geocoder=None):
+    """Resolves up to batch_size due jobs. Returns the number of jobs processed."""
+    if geocoder is None:
+        geocoder = Nominatim(user_agent="mechresq-app")
+    jobs = list(
+        GeocodeJob.objects.filter(status='PENDING', next_attempt_at__lte=timezone.now())
+        .order_by('next_attempt_at')[:batch_size]
+    )
+    last_call = 0.0
+    for job in jobs:
+        key = address_key(job.address)
+        entry = GeocodeCache.objects.filter(address_key=key).first()
+        if entry is None:
+            wait = GEOCODER_MIN_INTERVAL - (time.monotonic() - last_call)
+            if wait > 0:
+                time.sleep(wait)
+            last_call = time.monotonic()
+            try:
+                location = geocoder.geocode(job.address, timeout=GEOCODER_TIMEOUT)
+            except Exception as e:
+                job.attempts += 1
+                job.last_error = str(e)
+                if job.attempts >= MAX_ATTEMPTS:
+                    job.status = 'FAILED'
+                else:
+                    # Exponential backoff: 2, 4, 8, 16 minutes
+                    job.next_attempt_at = timezone.now() + timedelta(minutes=2 ** job.attempts)
+                job.save()
+                continue
+            entry, _ = GeocodeCache.objects.update_or_create(
+                address_key=key,
+                defaults={
+                    'address': normalize_address(job.address),
+                    'latitude': location.latitude if location else None,
+                    'longitude': location.longitude if location else None,
+                }
+            )
+
+        if entry.latitude is None or entry.longitude is None:
+            job.status = 'FAILED'
+            job.last_error = 'Address could not be geocoded.'
+        else:
+            apply_coordinates(job.target_type, job.target_id, entry.latitude, entry.longitude)
+            job.status = 'DONE'
+        job.attempts += 1
+        job.save()
+    return len(jobs)
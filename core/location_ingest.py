@@ -0,0 +1,215 @@
+"""
+Write-coalescing ingest for mechanic location pings.
+
+update_mechanic_location only records the ping in an in-process buffer that keeps the latest
+position per mechanic, and publishes it to the mechanic registry and the tracking cache so
+matching and live tracking see it at once.
+A background thread flushes the buffer every LOCATION_INGEST_FLUSH_SECONDS: one LocationHistory
+bulk_create plus one batched UPDATE each for mechanics and their active service requests,
+however many pings arrived in between. Pending positions are also flushed at interpreter exit,
+so only a process that is killed outright (SIGKILL, OOM) loses them: at most one interval of fixes.
+A fix older than the mechanic's last applied position (Mechanic.location_recorded_at, or the
+published tracking position) only goes into LocationHistory, so a late batch upload never moves
+the mechanic back. Each flush then runs arrival detection (see core.arrival) and refreshes the
+tracking state of the mechanics' active service requests (see core.tracking) for the applied
+positions.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, CharField, DateTimeField, FloatField, Value, When
+from django.utils import timezone
+
+from . import arrival
+from . import registry as mechanic_registry
+from . import tracking
+from .geo import cell_for
+from .models import LocationHistory, Mechanic, ServiceRequest
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ['ACCEPTED', 'IN_PROGRESS']
+DEFAULT_FLUSH_SECONDS = 5.0
+
+
+class LocationBuffer:
+    """Latest (latitude, longitude, recorded_at) per mechanic, safe to share between threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = {}
+
+    def __len__(self):
+        return len(self._latest)
+
+    def add(self, mechanic_id, latitude, longitude, recorded_at):
+        """Returns False when a newer fix for the mechanic is already buffered."""
+        with self._lock:
+            current = self._latest.get(mechanic_id)
+            # Pings can arrive out of order; an older fix never replaces a newer one
+            if current is None or current[2] <= recorded_at:
+                self._latest[mechanic_id] = (latitude, longitude, recorded_at)
+                return True
+            return False
+
+    def drain(self):
+        with self._lock:
+            latest, self._latest = self._latest, {}
+        return latest
+
+    def restore(self, positions):
+        """Puts back positions that failed to flush, unless a newer ping has arrived since."""
+        for mechanic_id, (latitude, longitude, recorded_at) in positions.items():
+            self.add(mechanic_id, latitude, longitude, recorded_at)
+
+
+_buffer = LocationBuffer()
+_flusher_lock = threading.Lock()
+_flusher = None
+
+
+def flush_interval():
+    return float(getattr(settings, 'LOCATION_INGEST_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS))
+
+
+def write_positions(positions):
+    """
+    Writes {mechanic_id: (latitude, longitude, recorded_at)} with a fixed number of queries.
+    Every fix goes into LocationHistory; only fixes newer than the mechanic's stored one move
+    the mechanic and its active service requests. Returns those applied positions.
+    """
+    if not positions:
+        return {}
+    with transaction.atomic():
+        LocationHistory.objects.bulk_create([
+            LocationHistory(mechanic_id=mechanic_id, latitude=latitude, longitude=longitude, timestamp=recorded_at)
+            for mechanic_id, (latitude, longitude, recorded_at) in positions.items()
+        ], batch_size=500)
+
+        # Locked so a concurrent flush in another process cannot apply an older fix after ours
+        stored = dict(
+            Mechanic.objects.select_for_update().filter(id__in=list(positions))
+            .values_list('id', 'location_recorded_at')
+        )
+        positions = {
+            mechanic_id: position for mechanic_id, position in positions.items()
+            if mechanic_id in stored and (stored[mechanic_id] is None or stored[mechanic_id] <= position[2])
+        }
+        if not positions:
+            return {}
+        mechanic_ids = list(positions)
+        Mechanic.objects.filter(id__in=mechanic_ids).update(
+            latitude=Case(*[When(id=mechanic_id, then=Value(lat)) for mechanic_id, (lat, _, _) in positions.items()], output_field=FloatField()),
+            longitude=Case(*[When(id=mechanic_id, then=Value(lng)) for mechanic_id, (_, lng, _) in positions.items()], output_field=FloatField()),
+            geocell=Case(*[When(id=mechanic_id, then=Value(cell_for(lat, lng))) for mechanic_id, (lat, lng, _) in positions.items()], output_field=CharField()),
+            location_recorded_at=Case(*[When(id=mechanic_id, then=Value(recorded_at)) for mechanic_id, (_, _, recorded_at) in positions.items()], output_field=DateTimeField()),
+        )
+        ServiceRequest.objects.filter(mechanic_id__in=mechanic_ids, status__in=ACTIVE_STATUSES).update(
+            mechanic_latitude=Case(*[When(mechanic_id=mechanic_id, then=Value(lat)) for mechanic_id, (lat, _, _) in positions.items()], output_field=FloatField()),
+            mechanic_longitude=Case(*[When(mechanic_id=mechanic_id, then=Value(lng)) for mechanic_id, (_, lng, _) in positions.items()], output_field=FloatField()),
+            updated_at=timezone.now(),
+        )
+    return positions
+
+
+def flush():
+    """Writes every buffered position. Returns the number of mechanics written."""
+    positions = _buffer.drain()
+    if not positions:
+        return 0
+    try:
+        applied = write_positions(positions)
+    except Exception:
+        _buffer.restore(positions)
+        raise
+    if not applied:
+        return len(positions)
+    positions = applied
+    try:
+        arrival.detect_arrivals(positions)
+    except Exception:
+        # The positions are stored; the next ping from the mechanic retries the check
+        logger.exception("Arrival detection failed for %d mechanics.", len(positions))
+    try:
+        tracking.update_request_states(positions)
+    except Exception:
+        logger.exception("Updating tracking states failed for %d mechanics.", len(positions))
+    return len(positions)
+
+
+def _flush_forever(interval):
+    while True:
+        time.sleep(interval)
+        # This thread owns its own connection, which no request cycle ever closes; drop it when
+        # it has broken or outlived CONN_MAX_AGE so the next flush reconnects
+        close_old_connections()
+        try:
+            flush()
+        except Exception:
+            logger.exception("Flushing mechanic locations failed; positions kept for the next flush.")
+        finally:
+            close_old_connections()
+
+
+def start_flusher():
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_forever, args=(flush_interval(),), name='location-ingest-flusher', daemon=True)
+            _flusher.start()
+            atexit.register(flush)
+
+
+def is_stale(mechanic, recorded_at):
+    """True when the mechanic already has a newer applied or published position than recorded_at."""
+    if mechanic.location_recorded_at is not None and mechanic.location_recorded_at > recorded_at:
+        return True
+    published = tracking.get_position(mechanic.id)
+    return published is not None and published['seq'] > int(recorded_at.timestamp() * 1000)
+
+
+def ingest(mechanic, latitude, longitude, recorded_at=None):
+    """
+    Buffers one location ping. With LOCATION_INGEST_FLUSH_SECONDS = 0 it is written immediately.
+    Returns False, without buffering the ping, when a newer fix is already buffered or applied.
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    recorded_at = recorded_at or timezone.now()
+    accepted = not is_stale(mechanic, recorded_at) and _buffer.add(mechanic.id, latitude, longitude, recorded_at)
+    if accepted:
+        mechanic.latitude = latitude
+        mechanic.longitude = longitude
+        mechanic_registry.publish(mechanic)
+        tracking.publish_position(mechanic.id, latitude, longitude, recorded_at)
+
+    if flush_interval() <= 0:
+        flush()
+    else:
+        start_flusher()
+    return accepted
+
+
+def ingest_batch(mechanic, fixes):
+    """
+    Stores a batch of (latitude, longitude, recorded_at) fixes uploaded after a connectivity gap.
+
+    Every fix but the newest goes into LocationHistory with one bulk_create. The newest is
+    ingested like a live ping, so the mechanic and active service requests only move to it
+    (and its history row is written by the flusher) unless a newer position is already
+    buffered or applied; otherwise it is stored with the rest.
+    """
+    fixes = sorted(fixes, key=lambda fix: fix[2])
+    if not fixes:
+        return
+    *older, (latitude, longitude, recorded_at) = fixes
+    if not ingest(mechanic, latitude, longitude, recorded_at):
+        older.append((latitude, longitude, recorded_at))
+    LocationHistory.objects.bulk_create([
+        LocationHistory(mechanic=mechanic, latitude=lat, longitude=lng, timestamp=fix_time)
+        for lat, lng, fix_time in older
+    ], batch_size=500)
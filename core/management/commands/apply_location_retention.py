@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core import retention
+
+
+class Command(BaseCommand):
+    help = "Archives and rolls up expired mechanic location history (run daily, e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raw-days', type=int, default=None, help='Days of individual fixes (raw rows and packed traces) to keep.')
+        parser.add_argument('--minute-days', type=int, default=None, help='Days of per-minute rollups to keep before folding them into hours.')
+        parser.add_argument('--archive-dir', default=None, help='Directory for the gzip CSV archives of expired raw points.')
+
+    def handle(self, *args, **options):
+        stats = retention.apply_retention(
+            raw_days=options['raw_days'], minute_days=options['minute_days'], archive_dir=options['archive_dir']
+        )
+        self.stdout.write(
+            f"Archived {stats['raw_archived']} points ({stats['traces_expired']} packed traces) into {len(stats['archives'])} files, "
+            f"wrote {stats['minute_rollups']} minute rollups, "
+            f"folded {stats['minute_compacted']} minute rollups into {stats['hour_rollups']} hour rollups."
+        )
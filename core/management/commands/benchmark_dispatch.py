@@ -0,0 +1,48 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import dispatch
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the dispatch solver on synthetic requests and mechanics (no database access)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--mechanics', type=int, default=5000)
+        parser.add_argument('--spread-km', type=float, default=60.0, help='Side of the square area the points are scattered over.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Centre on Bengaluru; one degree of latitude is ~111 km
+        spread = options['spread_km'] / 111.0
+        vehicle_types = ['car', 'motorcycle', 'truck']
+
+        def point():
+            return 12.97 + rng.uniform(-spread / 2, spread / 2), 77.59 + rng.uniform(-spread / 2, spread / 2)
+
+        requests = []
+        for index in range(options['requests']):
+            lat, lng = point()
+            requests.append({'id': index, 'lat': lat, 'lng': lng, 'vehicle_type': rng.choice(vehicle_types)})
+        mechanics = []
+        for index in range(options['mechanics']):
+            lat, lng = point()
+            mechanics.append({
+                'id': index, 'lat': lat, 'lng': lng,
+                'rating': rng.uniform(1, 5), 'specialization': rng.choice(vehicle_types).title(),
+            })
+
+        started = time.perf_counter()
+        assignments = dispatch.solve(requests, mechanics)
+        elapsed = time.perf_counter() - started
+
+        average_km = sum(km for _, _, km in assignments) / len(assignments) if assignments else 0.0
+        self.stdout.write(
+            f"{len(requests)} requests x {len(mechanics)} mechanics: "
+            f"{len(assignments)} assigned in {elapsed:.3f}s "
+            f"({len(requests) / elapsed:.0f} requests/s), average pickup distance {average_km:.2f} km"
+        )
@@ -0,0 +1,105 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core import trace_codec, trace_store
+from core.models import LocationHistory, LocationTrace, Mechanic
+
+
+def table_bytes(table):
+    """On-disk size of a table and its indexes, where the database can report it."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+            return cursor.fetchone()[0]
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+                    "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                    [table, table],
+                )
+            except Exception:
+                return None
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares storage size and read speed of raw LocationHistory rows against packed hourly "
+        "traces on synthetic fixes. Everything is written inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Hours of fixes to generate.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between fixes.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        mechanic = Mechanic.objects.first()
+        if mechanic is None:
+            self.stderr.write("At least one mechanic is needed to attach the synthetic fixes to.")
+            return
+        rng = random.Random(options['seed'])
+        end = trace_store.floor_to_hour(timezone.now()) - timedelta(days=1)
+        start = end - timedelta(hours=options['hours'])
+        count = int(options['hours'] * 3600 / options['interval'])
+
+        with transaction.atomic():
+            raw_before = table_bytes(LocationHistory._meta.db_table)
+            trace_before = table_bytes(LocationTrace._meta.db_table)
+
+            # A random walk around Bengaluru
+            lat, lng = 12.97, 77.59
+            fixes = []
+            for index in range(count):
+                lat += rng.uniform(-0.0002, 0.0002)
+                lng += rng.uniform(-0.0002, 0.0002)
+                fixes.append(LocationHistory(
+                    mechanic=mechanic, latitude=lat, longitude=lng,
+                    timestamp=start + timedelta(seconds=index * options['interval']),
+                ))
+            LocationHistory.objects.bulk_create(fixes, batch_size=5000)
+
+            started = time.perf_counter()
+            raw_rows = list(
+                LocationHistory.objects.filter(mechanic=mechanic, timestamp__gte=start, timestamp__lt=end)
+                .order_by('timestamp', 'id').values_list('id', 'latitude', 'longitude', 'timestamp')
+            )
+            raw_seconds = time.perf_counter() - started
+
+            traces, packed = trace_store.pack_hours(start, end)
+            blob_bytes = sum(len(data) for data in LocationTrace.objects.filter(
+                mechanic=mechanic, hour_start__gte=start, hour_start__lt=end
+            ).values_list('data', flat=True))
+            # pack_hours() has deleted the raw rows, so this reads the packed traces only
+            started = time.perf_counter()
+            packed_rows = trace_store.history_points(mechanic.id, start, end - timedelta(microseconds=1))
+            packed_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for data in LocationTrace.objects.filter(mechanic=mechanic, hour_start__gte=start, hour_start__lt=end).values_list('data', flat=True):
+                trace_codec.decode(data)
+            decode_seconds = time.perf_counter() - started
+
+            LocationHistory.objects.bulk_create(fixes, batch_size=5000)
+            raw_after = table_bytes(LocationHistory._meta.db_table)
+            trace_after = table_bytes(LocationTrace._meta.db_table)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{count} fixes over {options['hours']} hours, packed into {traces} traces ({packed} fixes).")
+        self.stdout.write(f"Packed blobs: {blob_bytes} bytes ({blob_bytes / count:.1f} bytes per fix).")
+        if raw_before is not None and raw_after is not None:
+            raw_bytes = raw_after - raw_before
+            self.stdout.write(f"LocationHistory table + indexes grew by {raw_bytes} bytes ({raw_bytes / count:.1f} bytes per fix).")
+            self.stdout.write(f"LocationTrace table grew by {trace_after - trace_before} bytes.")
+        else:
+            self.stdout.write("Table sizes are not available on this database backend.")
+        self.stdout.write(f"Read raw rows: {raw_seconds * 1000:.1f} ms for {len(raw_rows)} fixes.")
+        self.stdout.write(f"Read packed traces through history_points: {packed_seconds * 1000:.1f} ms for {len(packed_rows)} fixes.")
+        self.stdout.write(f"Decode packed blobs to arrays: {decode_seconds * 1000:.1f} ms.")
@@ -0,0 +1,76 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import outbox, push
+from core.models import OutboxEvent, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures push dispatch throughput against the fake transport. Synthetic users, tokens and "
+        "PUSH events are written inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--pushes', type=int, default=5000, help='PUSH events to queue, one recipient each.')
+        parser.add_argument('--payloads', type=int, default=5, help='Distinct push payloads among the events.')
+        parser.add_argument('--invalid-share', type=float, default=0.05, help='Share of users with an unregistered token.')
+        parser.add_argument('--failure-rate', type=float, default=0.01, help='Share of sends failing transiently.')
+        parser.add_argument('--latency-ms', type=float, default=50, help='Simulated round trip per multicast call.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Outbox events per worker batch.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        transport = push.FakeTransport(options['failure_rate'], options['latency_ms'], seed=options['seed'])
+        push.set_transport(transport)
+        # Transient failures are expected here; keep the per-event retry warnings out of the report
+        logging.getLogger('core.outbox').setLevel(logging.ERROR)
+        try:
+            with transaction.atomic():
+                self.run(transport, options)
+                transaction.set_rollback(True)
+        finally:
+            push.set_transport(None)
+
+    def run(self, transport, options):
+        invalid_every = int(1 / options['invalid_share']) if options['invalid_share'] > 0 else 0
+        users = User.objects.bulk_create([
+            User(
+                username=f'push-benchmark-{index}',
+                fcm_token=f"{'invalid' if invalid_every and index % invalid_every == 0 else 'token'}-{index}",
+            )
+            for index in range(options['users'])
+        ], batch_size=1000)
+        OutboxEvent.objects.bulk_create([
+            OutboxEvent(event_type='PUSH', payload={
+                'user_ids': [users[index % len(users)].id],
+                'title': f"Benchmark {index % options['payloads']}",
+                'body': 'Load test push.',
+                'data': None,
+            })
+            for index in range(options['pushes'])
+        ], batch_size=1000)
+
+        started = time.perf_counter()
+        processed = outbox.process_events(batch_size=options['batch_size'])
+        batches = 1
+        while processed < options['pushes']:
+            step = outbox.process_events(batch_size=options['batch_size'])
+            if not step:
+                break
+            processed += step
+            batches += 1
+        elapsed = time.perf_counter() - started
+
+        tokens_sent = sum(len(call['tokens']) for call in transport.sent)
+        retrying = OutboxEvent.objects.filter(event_type='PUSH', status='PENDING').count()
+        cleared = User.objects.filter(username__startswith='push-benchmark-', fcm_token__isnull=True).count()
+        self.stdout.write(f"{options['pushes']} pushes to {options['users']} users in {batches} worker batches: {elapsed:.2f} s "
+                          f"({options['pushes'] / elapsed:.0f} pushes/s).")
+        self.stdout.write(f"{len(transport.sent)} multicast calls carrying {tokens_sent} tokens "
+                          f"(one call per push would take {options['pushes'] * options['latency_ms'] / 1000:.1f} s of latency alone).")
+        self.stdout.write(f"{cleared} invalid tokens cleared; {retrying} events scheduled for retry.")
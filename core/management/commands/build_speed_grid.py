@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core import eta, trace_store
+
+
+class Command(BaseCommand):
+    help = "Builds the ETA speed-zone grid file from historical mechanic location traces."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='Path of the .npz file to write (defaults to ETA_SPEED_GRID_PATH).')
+        parser.add_argument('--min-samples', type=int, default=eta.MIN_CELL_SAMPLES, help='Segments required before a cell gets its own speed.')
+
+    def handle(self, *args, **options):
+        # Packed hourly traces and the raw rows not packed yet
+        mechanic_ids, lats, lngs, seconds = trace_store.fleet_points()
+        keys, speeds = eta.speeds_from_traces(mechanic_ids, lats, lngs, seconds, min_samples=options['min_samples'])
+        path = options['output'] or eta.grid_path()
+        eta.save_grid(path, keys, speeds)
+        self.stdout.write(f"Wrote speeds for {len(keys)} cells from {len(lats)} location fixes to {path}.")
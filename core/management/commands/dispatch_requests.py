@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import dispatch
+
+
+class Command(BaseCommand):
+    help = "Periodically assigns pending service requests to available mechanics in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run a single dispatch tick and exit.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between dispatch ticks.')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            assigned = dispatch.run_tick()
+            if assigned:
+                self.stdout.write(f"Assigned {len(assigned)} requests in {time.monotonic() - started:.2f}s.")
+            if options['once']:
+                break
+            time.sleep(max(0.0, options['interval'] - (time.monotonic() - started)))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import emergency
+
+
+class Command(BaseCommand):
+    help = "Alerts mechanics for pending emergency requests, widening the ring until someone accepts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process due emergency requests once and exit.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between scheduler runs.')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = emergency.run_due_escalations()
+            if processed:
+                self.stdout.write(f"Escalated {processed} emergency requests.")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import geocoding
+
+
+class Command(BaseCommand):
+    help = "Fills missing mechanic and service request coordinates from the geocoding job queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process one batch and exit.')
+        parser.add_argument('--scan', action='store_true', help='Queue every row that has no coordinates before processing.')
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--interval', type=float, default=10.0, help='Seconds to sleep when the queue is empty.')
+
+    def handle(self, *args, **options):
+        if options['scan']:
+            queued = geocoding.enqueue_missing()
+            self.stdout.write(f"Queued {queued} geocoding jobs.")
+
+        while True:
+            processed = geocoding.process_jobs(batch_size=options['batch_size'])
+            if processed:
+                self.stdout.write(f"Processed {processed} geocoding jobs.")
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['interval'])
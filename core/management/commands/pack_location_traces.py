@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import trace_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Packs completed hours of raw location history into compact per-mechanic hourly traces and "
+        "deletes the packed rows. Late fixes for hours packed earlier are merged into their traces."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=None,
+            help='Only pack this many completed hours back (default: every raw fix before the current hour).',
+        )
+
+    def handle(self, *args, **options):
+        # The current hour is still receiving fixes, so it is left raw
+        before = trace_store.floor_to_hour(timezone.now())
+        since = before - timedelta(hours=options['hours']) if options['hours'] is not None else None
+        traces, fixes = trace_store.pack_hours(since, before)
+        self.stdout.write(f"Packed {fixes} fixes into {traces} hourly traces.")
@@ -0,0 +1,31 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import outbox
+
+
+class Command(BaseCommand):
+    help = "Delivers queued notifications and emails from the outbox, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the due events once and exit.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when nothing is due.')
+        parser.add_argument('--purge-days', type=int, default=7, help='Delete delivered events older than this many days.')
+
+    def handle(self, *args, **options):
+        purged = outbox.purge_done(timezone.now() - timedelta(days=options['purge_days']))
+        if purged:
+            self.stdout.write(f"Purged {purged} delivered outbox events.")
+
+        while True:
+            processed = outbox.process_events(batch_size=options['batch_size'])
+            if processed:
+                self.stdout.write(f"Processed {processed} outbox events.")
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
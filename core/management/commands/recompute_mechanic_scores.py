@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import ranking
+
+
+class Command(BaseCommand):
+    help = "Rebuilds every mechanic's rating, job counters and ranking score from reviews and service requests."
+
+    def handle(self, *args, **options):
+        updated = ranking.recompute_all()
+        self.stdout.write(f"Recomputed ranking scores for {updated} mechanics.")
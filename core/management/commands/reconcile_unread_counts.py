@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import unread
+
+
+class Command(BaseCommand):
+    help = "Recounts unread notifications and corrects the per-user counters that have drifted."
+
+    def handle(self, *args, **options):
+        fixed = unread.reconcile()
+        self.stdout.write(f"Corrected unread counts for {fixed} users.")
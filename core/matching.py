@@ -0,0 +1,97 @@
+from . import nearby_cache, ranking, registry
+from .distance import rank_by_distance
+from .geo import cell_for, cells_within
+
+DEFAULT_NEAREST_COUNT = 10
+# How many nearest mechanics are scored for every one that is returned by best_mechanics
+RANKING_POOL_FACTOR = 3
+# Search rings (km) tried in order until enough mechanics are found
+SEARCH_RING_STEPS_KM = (5, 10, 25, 50, 100, 200)
+MAX_SEARCH_RADIUS_KM = 500
+
+
+def search_rings(max_km):
+    rings = [radius for radius in SEARCH_RING_STEPS_KM if radius < max_km]
+    rings.append(max_km)
+    return rings
+
+
+def candidates_in_cells(cells, available_only):
+    return [
+        (entry['id'], entry['lat'], entry['lng'])
+        for entry in registry.entries_in_cells(cells)
+        if entry['available'] or not available_only
+    ]
+
+
+def mechanics_within(lat, lng, radius_km, available_only=False):
+    """Returns (mechanic_id, km) pairs for every mechanic within radius_km, nearest first."""
+    return rank_by_distance(lat, lng, candidates_in_cells(cells_within(lat, lng, radius_km), available_only), max_km=radius_km)
+
+
+def nearest_mechanics(lat, lng, k=DEFAULT_NEAREST_COUNT, max_km=MAX_SEARCH_RADIUS_KM, available_only=False):
+    """
+    Finds the k mechanics nearest to (lat, lng), growing the search ring step by step.
+
+    Each step only reads mechanics from grid cells not covered by a previous ring, so dense
+    areas stop after the first small ring. Returns (ranked, radius_km) where ranked is a list
+    of (mechanic_id, km) pairs sorted nearest first and radius_km is the ring that was reached.
+    """
+    max_km = min(max_km, MAX_SEARCH_RADIUS_KM)
+
+    visited_cells = set()
+    candidates = []
+    ranked = []
+    radius_km = max_km
+    for radius_km in search_rings(max_km):
+        new_cells = [cell for cell in cells_within(lat, lng, radius_km) if cell not in visited_cells]
+        visited_cells.update(new_cells)
+        candidates.extend(candidates_in_cells(new_cells, available_only))
+
+        # Every mechanic within radius_km has been loaded, so the k nearest inside it are final
+        ranked = rank_by_distance(lat, lng, candidates, max_km=radius_km, limit=k)
+        if len(ranked) >= k:
+            break
+    return ranked, radius_km
+
+
+def cached_nearest_mechanics(lat, lng, k=DEFAULT_NEAREST_COUNT, max_km=MAX_SEARCH_RADIUS_KM, available_only=False):
+    """
+    Same result as nearest_mechanics, but ranks the candidate list cached for the point's geocell.
+
+    Falls back to the full ring search when the k nearest are not all within the cached radius.
+    """
+    cell = cell_for(lat, lng)
+    candidates = nearby_cache.get_candidates(cell)
+    if candidates is None:
+        candidates = [
+            (entry['id'], entry['lat'], entry['lng'], entry['available'])
+            for entry in registry.entries_in_cells(nearby_cache.covered_cells(lat, lng))
+        ]
+        nearby_cache.set_candidates(cell, candidates)
+    if available_only:
+        candidates = [candidate for candidate in candidates if candidate[3]]
+
+    for radius_km in search_rings(min(max_km, MAX_SEARCH_RADIUS_KM)):
+        if radius_km > nearby_cache.CACHED_RADIUS_KM:
+            break
+        ranked = rank_by_distance(lat, lng, candidates, max_km=radius_km, limit=k)
+        if len(ranked) >= k or radius_km >= max_km:
+            return ranked, radius_km
+    return nearest_mechanics(lat, lng, k=k, max_km=max_km, available_only=available_only)
+
+
+def best_mechanics_with_radius(lat, lng, k=DEFAULT_NEAREST_COUNT, vehicle_type=None, max_km=MAX_SEARCH_RADIUS_KM, available_only=False):
+    """
+    Returns the k best (mechanic_id, km) pairs for a request, ordered by combined ranking score,
+    and the radius the candidates were searched in. The nearest k * RANKING_POOL_FACTOR
+    mechanics are scored in one vectorized pass.
+    """
+    pool, radius_km = cached_nearest_mechanics(lat, lng, k=k * RANKING_POOL_FACTOR, max_km=max_km, available_only=available_only)
+    entries = registry.get_entries([mechanic_id for mechanic_id, _ in pool])
+    return ranking.rank_candidates(pool, entries, vehicle_type, limit=k), radius_km
+
+
+def best_mechanics(lat, lng, k=DEFAULT_NEAREST_COUNT, vehicle_type=None, max_km=MAX_SEARCH_RADIUS_KM, available_only=False):
+    """The k best (mechanic_id, km) pairs for a request; see best_mechanics_with_radius."""
+    return best_mechanics_with_radius(lat, lng, k, vehicle_type, max_km, available_only)[0]
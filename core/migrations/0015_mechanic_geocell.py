@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:57
+
+from math import floor
+
+from django.db import migrations, models
+
+# Frozen copy of core.geo.cell_for as of this migration, so later changes to it cannot alter it
+CELL_SIZE_DEG = 0.2
+
+
+def cell_for(lat, lng):
+    return f"{int(floor(float(lat) / CELL_SIZE_DEG))}:{int(floor(float(lng) / CELL_SIZE_DEG))}"
+
+
+def populate_geocells(apps, schema_editor):
+    Mechanic = apps.get_model('core', 'Mechanic')
+    mechanics = list(Mechanic.objects.filter(latitude__isnull=False, longitude__isnull=False))
+    for mechanic in mechanics:
+        mechanic.geocell = cell_for(mechanic.latitude, mechanic.longitude)
+    Mechanic.objects.bulk_update(mechanics, ['geocell'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_mechanic_preferred_language_user_preferred_language'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mechanic',
+            name='geocell',
+            field=models.CharField(blank=True, db_index=True, max_length=32),
+        ),
+        migrations.RunPython(populate_geocells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_geocodecache_geocodejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emergencyrequest',
+            name='next_escalation_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='emergencyrequest',
+            name='notified_mechanics',
+            field=models.ManyToManyField(blank=True, related_name='notified_emergency_requests', to='core.mechanic'),
+        ),
+    ]
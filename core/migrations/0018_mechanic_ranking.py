@@ -0,0 +1,92 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:08
+
+from math import log1p
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+# Frozen copies of core.ranking.vehicle_type_mask and static_score as of this migration, so later
+# changes to them cannot alter it
+VEHICLE_TYPE_KEYWORDS = {
+    1: ('car', 'four wheel', '4 wheel', 'sedan', 'suv', 'hatchback'),
+    2: ('motorcycle', 'motorbike', 'bike', 'two wheel', '2 wheel', 'scooter'),
+    4: ('truck', 'lorry', 'heavy', 'bus', 'commercial'),
+}
+GENERAL_KEYWORDS = ('general', 'all vehicle', 'any vehicle', 'multi')
+RATING_WEIGHT = 2.0
+COMPLETED_JOBS_WEIGHT = 1.0
+
+
+def vehicle_type_mask(specialization):
+    text = (specialization or '').lower()
+    if any(keyword in text for keyword in GENERAL_KEYWORDS):
+        return sum(VEHICLE_TYPE_KEYWORDS)
+    mask = 0
+    for bit, keywords in VEHICLE_TYPE_KEYWORDS.items():
+        if any(keyword in text for keyword in keywords):
+            mask |= bit
+    return mask
+
+
+def static_score(rating, completed_jobs):
+    return RATING_WEIGHT * float(rating or 0) + COMPLETED_JOBS_WEIGHT * log1p(completed_jobs or 0)
+
+
+def populate_ranking(apps, schema_editor):
+    Mechanic = apps.get_model('core', 'Mechanic')
+    mechanics = list(Mechanic.objects.annotate(
+        reviews=Count('servicerequest__review'),
+        completed=Count('servicerequest', filter=Q(servicerequest__status='COMPLETED')),
+    ))
+    for mechanic in mechanics:
+        mechanic.review_count = mechanic.reviews
+        mechanic.completed_jobs = mechanic.completed
+        mechanic.vehicle_types = vehicle_type_mask(mechanic.specialization)
+        mechanic.rank_score = static_score(mechanic.rating, mechanic.completed_jobs)
+    Mechanic.objects.bulk_update(mechanics, ['review_count', 'completed_jobs', 'vehicle_types', 'rank_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_emergencyrequest_escalation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mechanic',
+            name='accepted_jobs',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='mechanic',
+            name='avg_accept_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mechanic',
+            name='completed_jobs',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='mechanic',
+            name='rank_score',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='mechanic',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='mechanic',
+            name='vehicle_types',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='servicerequest',
+            name='accepted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(populate_ranking, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_locationhistory_fix_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('MINUTE', 'Minute'), ('HOUR', 'Hour')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('point_count', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='locationhistory',
+            index=models.Index(fields=['mechanic', 'timestamp'], name='core_locati_mechani_28ca2e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='locationhistory',
+            index=models.Index(fields=['timestamp'], name='core_locati_timesta_9553ff_idx'),
+        ),
+        migrations.AddField(
+            model_name='locationrollup',
+            name='mechanic',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.mechanic'),
+        ),
+        migrations.AddIndex(
+            model_name='locationrollup',
+            index=models.Index(fields=['resolution', 'bucket_start'], name='core_locati_resolut_f74b36_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='locationrollup',
+            constraint=models.UniqueConstraint(fields=('mechanic', 'resolution', 'bucket_start'), name='unique_location_rollup_bucket'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_location_history_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationTrace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour_start', models.DateTimeField()),
+                ('point_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('mechanic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.mechanic')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='locationtrace',
+            constraint=models.UniqueConstraint(fields=('mechanic', 'hour_start'), name='unique_location_trace_hour'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_locationtrace'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicerequest',
+            name='arrived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
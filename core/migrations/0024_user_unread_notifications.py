@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:26
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_unread_counts(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    users = list(User.objects.annotate(unread=Count('notifications', filter=Q(notifications__read=False))).filter(unread__gt=0))
+    for user in users:
+        user.unread_notifications = user.unread
+    User.objects.bulk_update(users, ['unread_notifications'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_unread_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_notification_feed_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='event_type',
+            field=models.CharField(choices=[('NOTIFICATION', 'Notification'), ('PAYMENT_RECEIPT_EMAIL', 'Payment Receipt Email'), ('PUSH', 'Push Notification')], max_length=40),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_outboxevent_push'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mechanic',
+            name='location_recorded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,9 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.utils import timezone
+from collections import Counter
 from decimal import Decimal
 from django.conf import settings # Import settings
+from .geo import cell_for
 
 # Define language choices based on settings.LANGUAGES
 LANGUAGE_CHOICES = settings.LANGUAGES
@@ -26,10 +28,40 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a user's feed, newest first
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_feed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.notification_type} - {self.title}"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        # The row and the increment commit together, which core.unread.recount relies on
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding and not self.read:
+                # Keep the recipient's denormalized unread count in step (see core.unread)
+                User.objects.filter(pk=self.recipient_id).update(unread_notifications=models.F('unread_notifications') + 1)
+
+    @classmethod
+    def increment_unread(cls, recipient_ids):
+        """Adds one to User.unread_notifications per id; an id may repeat."""
+        recipients_by_count = {}
+        for recipient_id, count in Counter(recipient_ids).items():
+            recipients_by_count.setdefault(count, []).append(recipient_id)
+        for count, ids in recipients_by_count.items():
+            User.objects.filter(pk__in=ids).update(unread_notifications=models.F('unread_notifications') + count)
+
+    @classmethod
+    def bulk_create_notifications(cls, notifications, batch_size=500):
+        """bulk_create that also updates the recipients' unread counts, which bulk_create alone skips."""
+        with transaction.atomic():
+            created = cls.objects.bulk_create(notifications, batch_size=batch_size)
+            cls.increment_unread([notification.recipient_id for notification in created if not notification.read])
+        return created
+
     @classmethod
     def create_service_request_notification(cls, recipient, service_request):
         if getattr(recipient, 'is_mechanic', False):
@@ -45,6 +77,19 @@ class Notification(models.Model):
             message=message
         )
 
+    @classmethod
+    def bulk_create_service_request_notifications(cls, recipient_ids, service_request, batch_size=500):
+        """Notifies many mechanics of a new request with one INSERT per batch."""
+        return cls.bulk_create_notifications([
+            cls(
+                recipient_id=recipient_id,
+                notification_type='SERVICE_REQUEST',
+                title="New Request Received",
+                message="A new service request is available near your area."
+            )
+            for recipient_id in recipient_ids
+        ], batch_size=batch_size)
+
     @classmethod
     def create_status_update_notification(cls, recipient, service_request):
         status = service_request.status
@@ -118,6 +163,29 @@ class Notification(models.Model):
             message=message
         )
 
+    @classmethod
+    def create_mechanic_arrived_notification(cls, recipient, service_request):
+        title = "Mechanic Has Arrived"
+        message = f"Your mechanic has reached the location of request #{service_request.id}."
+        return cls.objects.create(
+            recipient=recipient,
+            notification_type='STATUS_UPDATE',
+            title=title,
+            message=message
+        )
+
+    @classmethod
+    def create_emergency_accepted_notification(cls, recipient, emergency_request):
+        username = emergency_request.mechanic.user.username
+        title = f"Emergency Request Accepted by {username}"
+        message = f"Mechanic {username} is on their way to your emergency location."
+        return cls.objects.create(
+            recipient=recipient,
+            notification_type='STATUS_UPDATE',
+            title=title,
+            message=message
+        )
+
     @classmethod
     def create_profile_updated_notification(cls, recipient):
         if getattr(recipient, 'is_mechanic', False):
@@ -226,6 +294,7 @@ class User(AbstractUser):
     )
     fcm_token = models.CharField(max_length=255, blank=True, null=True, verbose_name="FCM Token for Push Notifications")
     preferred_language = models.CharField(max_length=10, choices=LANGUAGE_CHOICES, default='en') # New field
+    unread_notifications = models.PositiveIntegerField(default=0) # Denormalized; see core.unread
     
     def get_profile_picture_url(self):
         if self.profile_picture and hasattr(self.profile_picture, 'url'):
@@ -245,10 +314,27 @@ class Mechanic(models.Model):
     rating = models.FloatField(default=0.0)
     base_fee = models.DecimalField(max_digits=10, decimal_places=2, default=50.00)
     preferred_language = models.CharField(max_length=10, choices=LANGUAGE_CHOICES, default='en') # New field
+    geocell = models.CharField(max_length=32, blank=True, db_index=True) # Spatial grid cell, derived from latitude/longitude
+    location_recorded_at = models.DateTimeField(null=True, blank=True) # Time of the fix latitude/longitude come from
+    # Ranking inputs, maintained incrementally (see core/ranking.py)
+    review_count = models.PositiveIntegerField(default=0)
+    completed_jobs = models.PositiveIntegerField(default=0)
+    accepted_jobs = models.PositiveIntegerField(default=0)
+    avg_accept_seconds = models.FloatField(null=True, blank=True)
+    vehicle_types = models.PositiveSmallIntegerField(default=0) # Bitmask of vehicle types covered by the specialization
+    rank_score = models.FloatField(default=0.0)
 
     def __str__(self):
         return f"{self.user.username} - {self.specialization}"
 
+    def save(self, *args, **kwargs):
+        # Keep the spatial grid cell in sync with the coordinates
+        self.geocell = cell_for(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ({'latitude', 'longitude'} & set(update_fields)):
+            kwargs['update_fields'] = set(update_fields) | {'geocell'}
+        super().save(*args, **kwargs)
+
 class ServiceRequest(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
@@ -273,6 +359,8 @@ class ServiceRequest(models.Model):
     mechanic_longitude = models.FloatField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     scheduled_time = models.DateTimeField(null=True, blank=True)
+    accepted_at = models.DateTimeField(null=True, blank=True)
+    arrived_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -280,10 +368,28 @@ class ServiceRequest(models.Model):
     final_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     notes = models.TextField(blank=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so saves can tell a transition from any other update
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def status_changed(self):
+        """True when status differs from the value last loaded from or saved to the database."""
+        if 'status' in self.get_deferred_fields():
+            return False
+        return self.status != getattr(self, '_loaded_status', None)
+
     def save(self, *args, **kwargs):
         if self.status == 'COMPLETED' and not self.completed_at:
             self.completed_at = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'completed_at'}
         super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'status' in update_fields:
+            self._loaded_status = self.status
 
     def mark_as_completed(self):
         if self.status != 'COMPLETED':
@@ -437,6 +543,9 @@ class EmergencyRequest(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
+    # Ring-based fan-out: mechanics already alerted and when the next, wider ring is due
+    notified_mechanics = models.ManyToManyField(Mechanic, blank=True, related_name='notified_emergency_requests')
+    next_escalation_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     def __str__(self):
         return f"Emergency Request by {self.user.username} at {self.created_at.strftime('%Y-%m-%d %H:%M')}"
@@ -446,7 +555,128 @@ class LocationHistory(models.Model):
     mechanic = models.ForeignKey(Mechanic, on_delete=models.CASCADE)
     latitude = models.FloatField()
     longitude = models.FloatField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now) # Time of the fix, which can be earlier than the insert
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['mechanic', 'timestamp']),
+            models.Index(fields=['timestamp']),
+        ]
 
     def __str__(self):
         return f"{self.mechanic.user.username} at {self.timestamp}"
+
+
+class LocationRollup(models.Model):
+    """Average mechanic position per minute or hour, kept after raw LocationHistory expires."""
+    RESOLUTION_CHOICES = [
+        ('MINUTE', 'Minute'),
+        ('HOUR', 'Hour'),
+    ]
+
+    mechanic = models.ForeignKey(Mechanic, on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    point_count = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mechanic', 'resolution', 'bucket_start'], name='unique_location_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'bucket_start']),
+        ]
+
+    def __str__(self):
+        return f"{self.mechanic.user.username} {self.resolution.lower()} at {self.bucket_start}"
+
+
+class LocationTrace(models.Model):
+    """One hour of a mechanic's location fixes packed into a binary blob (see core/trace_codec.py)."""
+    mechanic = models.ForeignKey(Mechanic, on_delete=models.CASCADE)
+    hour_start = models.DateTimeField()
+    point_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mechanic', 'hour_start'], name='unique_location_trace_hour'),
+        ]
+
+    def __str__(self):
+        return f"{self.mechanic.user.username} trace at {self.hour_start}"
+
+
+class GeocodeCache(models.Model):
+    address_key = models.CharField(max_length=64, unique=True) # SHA-256 of the normalized address
+    address = models.TextField()
+    latitude = models.FloatField(null=True, blank=True) # Null when the geocoder found nothing
+    longitude = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.address
+
+
+class GeocodeJob(models.Model):
+    TARGET_CHOICES = [
+        ('MECHANIC', 'Mechanic'),
+        ('SERVICE_REQUEST', 'Service Request'),
+    ]
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    target_type = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    target_id = models.PositiveBigIntegerField()
+    address = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"Geocode {self.target_type} #{self.target_id} ({self.status})"
+
+class OutboxEvent(models.Model):
+    EVENT_TYPES = [
+        ('NOTIFICATION', 'Notification'),
+        ('PAYMENT_RECEIPT_EMAIL', 'Payment Receipt Email'),
+        ('PUSH', 'Push Notification'),
+    ]
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    event_type = models.CharField(max_length=40, choices=EVENT_TYPES)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.id} ({self.status})"
@@ -0,0 +1,50 @@
+"""
+Short-lived per-geocell cache of nearby-mechanic candidates.
+
+For every requested cell we cache the mechanics found within CACHED_RADIUS_KM of any point of
+that cell, so repeated nearby-mechanics lookups from the same area rank a small cached list
+instead of scanning the registry again. Entries expire after NEARBY_CACHE_SECONDS and are
+dropped early when a mechanic moves into or out of a cell they cover, or changes availability.
+"""
+from django.core.cache import caches
+
+from .geo import CELL_SIZE_DEG, KM_PER_DEGREE, cell_index, cells_within
+
+NEARBY_CACHE_SECONDS = 30
+CACHED_RADIUS_KM = 25
+# A cell spans at most this many km, so padding by it covers every point inside the cell
+CELL_PADDING_KM = CELL_SIZE_DEG * KM_PER_DEGREE
+KEY_PREFIX = 'nearby-mechanics'
+
+
+def get_cache():
+    return caches['default']
+
+
+def cell_centre(lat, lng):
+    row, col = cell_index(lat, lng)
+    return (row + 0.5) * CELL_SIZE_DEG, (col + 0.5) * CELL_SIZE_DEG
+
+
+def covered_cells(lat, lng):
+    """Returns the cells whose mechanics are cached for the cell containing (lat, lng)."""
+    return cells_within(*cell_centre(lat, lng), CACHED_RADIUS_KM + CELL_PADDING_KM)
+
+
+def get_candidates(cell):
+    """Returns the cached list of (mechanic_id, lat, lng, available) tuples for a cell, or None."""
+    return get_cache().get(f'{KEY_PREFIX}:{cell}')
+
+
+def set_candidates(cell, candidates):
+    get_cache().set(f'{KEY_PREFIX}:{cell}', candidates, timeout=NEARBY_CACHE_SECONDS)
+
+
+def invalidate_cell(cell):
+    """Drops every cached entry whose candidates may include mechanics from the given cell."""
+    if not cell:
+        return
+    row, col = (int(part) for part in cell.split(':'))
+    centre_lat, centre_lng = (row + 0.5) * CELL_SIZE_DEG, (col + 0.5) * CELL_SIZE_DEG
+    affected = cells_within(centre_lat, centre_lng, CACHED_RADIUS_KM + 2 * CELL_PADDING_KM)
+    get_cache().delete_many([f'{KEY_PREFIX}:{key}' for key in affected])
@@ -1,23 +1,111 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Q
+from django.http import JsonResponse
+from . import unread
+from .cursors import encode_cursor, decode_cursor
 from .models import Notification
 
+NOTIFICATIONS_PAGE_SIZE = 20
+MAX_NOTIFICATIONS_PAGE_SIZE = 100
+MAX_MARK_READ_IDS = 1000
+
+def notifications_page(user, cursor=None, limit=NOTIFICATIONS_PAGE_SIZE):
+    """
+    One page of the user's notifications, newest first by (created_at, id), strictly after the
+    cursor. Returns (notifications, next_cursor); next_cursor is None on the last page.
+    """
+    notifications = Notification.objects.filter(recipient=user).order_by('-created_at', '-id')
+    if cursor is not None:
+        created_at, notification_id = cursor
+        notifications = notifications.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=notification_id)
+        )
+    page = list(notifications[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+    return page, next_cursor
+
+def wants_json(request):
+    return 'application/json' in request.headers.get('Accept', '')
+
 @login_required
 def notifications_list(request):
-    notifications = Notification.objects.filter(recipient=request.user).order_by('-created_at')
+    try:
+        cursor = decode_cursor(request.GET.get('cursor'))
+    except ValueError:
+        cursor = None
+    notifications, next_cursor = notifications_page(request.user, cursor)
     return render(request, 'notifications/notifications.html', {
-        'notifications': notifications
+        'notifications': notifications,
+        'next_cursor': next_cursor,
+        'is_first_page': cursor is None,
+    })
+
+@login_required
+def notifications_feed(request):
+    try:
+        cursor = decode_cursor(request.GET.get('cursor'))
+        limit = int(request.GET.get('limit', NOTIFICATIONS_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor or limit.'}, status=400)
+    limit = min(max(limit, 1), MAX_NOTIFICATIONS_PAGE_SIZE)
+
+    notifications, next_cursor = notifications_page(request.user, cursor, limit)
+    return JsonResponse({
+        'success': True,
+        'notifications': [{
+            'id': notification.id,
+            'notification_type': notification.notification_type,
+            'title': notification.title,
+            'message': notification.message,
+            'read': notification.read,
+            'created_at': notification.created_at.isoformat(),
+        } for notification in notifications],
+        'next_cursor': next_cursor,
+        'unread_count': request.user.unread_notifications,
     })
 
 @login_required
 def mark_notification_read(request, notification_id):
     if request.method == 'POST':
         notification = get_object_or_404(Notification, id=notification_id, recipient=request.user)
-        notification.read = True
-        notification.save()
+        unread.mark_read(request.user, [notification.id])
         messages.success(request, 'Notification marked as read.')
     return redirect('core:notifications')
 
+@login_required
+def mark_notifications_read(request):
+    """Marks the notifications in ?ids=1,2,3 (or repeated `ids` form fields) read with one UPDATE."""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method.'}, status=405)
+    raw_ids = request.POST.getlist('ids') or request.GET.get('ids', '').split(',')
+    try:
+        ids = [int(value) for value in raw_ids if value.strip()]
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'ids must be notification ids.'}, status=400)
+    if not ids or len(ids) > MAX_MARK_READ_IDS:
+        return JsonResponse({'success': False, 'error': f'Give between 1 and {MAX_MARK_READ_IDS} ids.'}, status=400)
+
+    marked = unread.mark_read(request.user, ids)
+    if wants_json(request):
+        return JsonResponse({'success': True, 'marked': marked, 'unread_count': request.user.unread_notifications})
+    messages.success(request, f'{marked} notifications marked as read.')
+    return redirect('core:notifications')
+
+@login_required
+def mark_all_notifications_read(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method.'}, status=405)
+    marked = unread.mark_read(request.user)
+    if wants_json(request):
+        return JsonResponse({'success': True, 'marked': marked, 'unread_count': request.user.unread_notifications})
+    messages.success(request, 'All notifications marked as read.')
+    return redirect('core:notifications')
+
 def get_unread_notifications_count(user):
-    return Notification.objects.filter(recipient=user, read=False).count()
\ No newline at end of file
+    # Denormalized on the user, which the auth middleware has already loaded
+    return user.unread_notifications
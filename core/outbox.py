@@ -0,0 +1,176 @@
+"""
+Transactional outbox for notification side effects.
+
+Request handlers do not create Notification rows or send email themselves. They call notify()
+or enqueue() inside the transaction that changes the data, which writes one OutboxEvent row, so
+the event exists exactly when the change does. The process_outbox management command drains due
+events in batches, runs the handler for each and retries failures with exponential backoff.
+Event types with a batch handler (pushes, see core.push) are handed over as one list per batch.
+"""
+import logging
+from datetime import timedelta
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.utils import timezone
+
+from . import push as push_dispatch
+from .models import EmergencyRequest, Mechanic, Notification, OutboxEvent, Payment, Review, ServiceRequest, User
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 30
+MAX_RETRY_SECONDS = 60 * 60
+# Objects a notification can refer to, by the keyword its Notification.create_* method takes
+RELATED_MODELS = {
+    'service_request': ServiceRequest,
+    'payment': Payment,
+    'review': Review,
+    'mechanic': Mechanic,
+    'emergency_request': EmergencyRequest,
+}
+
+
+def enqueue(event_type, payload):
+    return OutboxEvent.objects.create(event_type=event_type, payload=payload)
+
+
+def notify(kind, recipient=None, **related):
+    """
+    Queues Notification.create_<kind>_notification(recipient, **related), e.g.
+    notify('payment', user, payment=payment). Related objects are stored by primary key.
+    """
+    if not hasattr(Notification, f'create_{kind}_notification'):
+        raise ValueError(f"Unknown notification kind: {kind}")
+    return enqueue('NOTIFICATION', {
+        'kind': kind,
+        'recipient_id': recipient.pk if recipient is not None else None,
+        'related': {name: obj.pk for name, obj in related.items()},
+    })
+
+
+def send_payment_receipt(payment):
+    return enqueue('PAYMENT_RECEIPT_EMAIL', {'payment_id': payment.pk})
+
+
+def push(user_ids, title, body, data=None):
+    """Queues a push notification to the devices of the given users."""
+    # FCM only accepts string values in the data payload
+    data = {str(key): str(value) for key, value in data.items()} if data else None
+    return enqueue('PUSH', {'user_ids': list(user_ids), 'title': title, 'body': body, 'data': data})
+
+
+def push_notifications(notifications):
+    """
+    Queues the pushes for Notification rows written in bulk (fan-outs, dispatch offers,
+    escalations): one PUSH event per distinct title, message and type, for all its recipients.
+    """
+    recipients = {}
+    for notification in notifications:
+        key = (notification.title, notification.message, notification.notification_type)
+        recipients.setdefault(key, []).append(notification.recipient_id)
+    for (title, message, notification_type), user_ids in recipients.items():
+        push(user_ids, title, message, {'notification_type': notification_type})
+
+
+def deliver_notification(payload):
+    kwargs = {
+        name: RELATED_MODELS[name].objects.get(pk=pk)
+        for name, pk in payload['related'].items()
+    }
+    if payload['recipient_id'] is not None:
+        kwargs['recipient'] = User.objects.get(pk=payload['recipient_id'])
+    notification = getattr(Notification, f"create_{payload['kind']}_notification")(**kwargs)
+    if notification.recipient.fcm_token:
+        push([notification.recipient_id], notification.title, notification.message, {'notification_type': notification.notification_type})
+
+
+def deliver_payment_receipt(payload):
+    # Imported here: rendering the receipt pulls in the PDF toolkit, which only the worker needs
+    from .emails import send_payment_receipt_email
+    payment = Payment.objects.select_related('service_request__user', 'service_request__mechanic__user').get(pk=payload['payment_id'])
+    send_payment_receipt_email(payment)
+
+
+HANDLERS = {
+    'NOTIFICATION': deliver_notification,
+    'PAYMENT_RECEIPT_EMAIL': deliver_payment_receipt,
+}
+# Handlers that take every due event of their type at once and return {event_id: error} for the
+# events to retry
+BATCH_HANDLERS = {
+    'PUSH': push_dispatch.deliver_batch,
+}
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 30 s, 1, 2, 4 ... minutes, capped at an hour."""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAX_RETRY_SECONDS))
+
+
+def process_events(batch_size=100):
+    """
+    Runs up to batch_size due events. Returns the number processed.
+
+    The batch is locked with SKIP LOCKED where the database supports it, so several workers can
+    drain the outbox side by side. Each event runs in its own savepoint: a failing handler is
+    rolled back and rescheduled without affecting the rest of the batch.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        results = {}
+        batched = {}
+        for event in events:
+            if event.event_type in BATCH_HANDLERS:
+                batched.setdefault(event.event_type, []).append(event)
+                continue
+            try:
+                with transaction.atomic():
+                    HANDLERS[event.event_type](event.payload)
+            except Exception as e:
+                results[event.id] = e
+            else:
+                results[event.id] = None
+        for event_type, group in batched.items():
+            try:
+                with transaction.atomic():
+                    errors = BATCH_HANDLERS[event_type](group)
+            except Exception as e:
+                errors = {event.id: e for event in group}
+            for event in group:
+                results[event.id] = errors.get(event.id)
+
+        for event in events:
+            event.attempts += 1
+            error = results[event.id]
+            if error is None:
+                event.status = 'DONE'
+                event.last_error = ''
+            elif isinstance(error, ObjectDoesNotExist):
+                # The row the event refers to is gone; retrying cannot help
+                event.status = 'FAILED'
+                event.last_error = str(error)
+            else:
+                logger.warning("Outbox event %s failed (attempt %d): %s", event.id, event.attempts, error)
+                event.last_error = str(error)
+                if event.attempts >= MAX_ATTEMPTS:
+                    event.status = 'FAILED'
+                else:
+                    event.next_attempt_at = now + retry_delay(event.attempts)
+            if event.status != 'PENDING':
+                event.processed_at = timezone.now()
+        OutboxEvent.objects.bulk_update(
+            events, ['payload', 'status', 'attempts', 'next_attempt_at', 'last_error', 'processed_at'], batch_size=500
+        )
+    return len(events)
+
+
+def purge_done(older_than):
+    """Deletes events delivered before older_than. Returns the number deleted."""
+    return OutboxEvent.objects.filter(status='DONE', processed_at__lt=older_than).delete()[0]
@@ -0,0 +1,159 @@
+"""
+Batched push-notification dispatch.
+
+Pushes are queued as PUSH outbox events (outbox.push) and delivered by the outbox worker a
+batch at a time: deliver_batch() looks up every recipient's FCM token in one query, groups the
+pushes that share a payload and sends each group as multicast messages of up to
+MAX_MULTICAST_TOKENS tokens. Tokens FCM reports as unregistered or invalid are cleared from
+User.fcm_token; recipients whose send failed transiently stay on the event, which the outbox
+retries with backoff.
+
+The transport is pluggable through settings.PUSH_TRANSPORT (a dotted path): FirebaseTransport
+talks to FCM, FakeTransport stands in for it locally and in load benchmarks.
+"""
+import json
+import random
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import User
+
+# FCM accepts at most this many tokens per multicast message
+MAX_MULTICAST_TOKENS = 500
+DEFAULT_TRANSPORT = 'core.push.FirebaseTransport'
+
+SENT = 'sent'
+INVALID = 'invalid' # The token will never work again; forget it
+RETRY = 'retry'
+
+
+class FirebaseTransport:
+    """Sends through the Firebase Admin SDK, initialized by core.firebase_admin_init."""
+
+    def __init__(self):
+        from firebase_admin import exceptions, messaging
+        from . import firebase_admin_init # noqa: F401 (initializes the default app)
+        self.messaging = messaging
+        self.invalid_errors = (
+            messaging.UnregisteredError, messaging.SenderIdMismatchError, exceptions.InvalidArgumentError,
+        )
+
+    def send_multicast(self, tokens, title, body, data=None):
+        """Returns one (outcome, error) pair per token, in order."""
+        message = self.messaging.MulticastMessage(
+            tokens=tokens,
+            notification=self.messaging.Notification(title=title, body=body),
+            data=data,
+        )
+        response = self.messaging.send_each_for_multicast(message)
+        results = []
+        for send_response in response.responses:
+            if send_response.success:
+                results.append((SENT, None))
+            elif isinstance(send_response.exception, self.invalid_errors):
+                results.append((INVALID, str(send_response.exception)))
+            else:
+                results.append((RETRY, str(send_response.exception)))
+        return results
+
+
+class FakeTransport:
+    """
+    Records multicasts instead of sending them. Tokens starting with 'invalid' are reported as
+    unregistered, a failure_rate share of the rest fails transiently, and latency_ms simulates
+    the round trip of one multicast call.
+    """
+
+    def __init__(self, failure_rate=0.0, latency_ms=0, seed=None):
+        self.failure_rate = failure_rate
+        self.latency_ms = latency_ms
+        self.random = random.Random(seed)
+        self.sent = []
+
+    def send_multicast(self, tokens, title, body, data=None):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        self.sent.append({'tokens': list(tokens), 'title': title, 'body': body, 'data': data})
+        results = []
+        for token in tokens:
+            if token.startswith('invalid'):
+                results.append((INVALID, 'Requested entity was not found.'))
+            elif self.random.random() < self.failure_rate:
+                results.append((RETRY, 'Service unavailable.'))
+            else:
+                results.append((SENT, None))
+        return results
+
+
+_transport = None
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        _transport = import_string(getattr(settings, 'PUSH_TRANSPORT', DEFAULT_TRANSPORT))()
+    return _transport
+
+
+def set_transport(transport):
+    """Replaces the transport, e.g. with a FakeTransport; None reloads it from settings."""
+    global _transport
+    _transport = transport
+
+
+def payload_key(payload):
+    return payload['title'], payload['body'], json.dumps(payload.get('data') or {}, sort_keys=True)
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def deliver_batch(events, transport=None):
+    """
+    Delivers PUSH outbox events. Events whose recipients all succeeded (or had no usable token)
+    are done; for the rest the payload is narrowed to the recipients still to retry and the
+    returned {event_id: error} tells the outbox to reschedule them.
+    """
+    transport = transport or get_transport()
+    user_ids = {user_id for event in events for user_id in event.payload['user_ids']}
+    tokens = dict(
+        User.objects.filter(id__in=user_ids).exclude(fcm_token__isnull=True).exclude(fcm_token='')
+        .values_list('id', 'fcm_token')
+    )
+
+    # payload key -> token -> [(event, user_id)]; a token is sent once per payload
+    groups = {}
+    for event in events:
+        recipients = groups.setdefault(payload_key(event.payload), {})
+        for user_id in event.payload['user_ids']:
+            if user_id in tokens:
+                recipients.setdefault(tokens[user_id], []).append((event, user_id))
+
+    retry_users = {}
+    errors = {}
+    invalid_tokens = []
+    for (title, body, data), recipients in groups.items():
+        data = json.loads(data) or None
+        for batch in chunks(list(recipients), MAX_MULTICAST_TOKENS):
+            try:
+                results = transport.send_multicast(batch, title, body, data)
+            except Exception as e:
+                results = [(RETRY, str(e))] * len(batch)
+            for token, (outcome, error) in zip(batch, results):
+                if outcome == INVALID:
+                    invalid_tokens.append(token)
+                elif outcome == RETRY:
+                    for event, user_id in recipients[token]:
+                        retry_users.setdefault(event.id, []).append(user_id)
+                        errors[event.id] = error
+
+    if invalid_tokens:
+        User.objects.filter(fcm_token__in=invalid_tokens).update(fcm_token=None)
+    for event in events:
+        if event.id in retry_users:
+            event.payload = {**event.payload, 'user_ids': retry_users[event.id]}
+    return errors
@@ -0,0 +1,160 @@
+"""
+Mechanic ranking for matching.
+
+Each mechanic keeps a precomputed rank_score built from rating, completed jobs and how quickly
+they accept requests, plus a vehicle_types bitmask derived from the free-text specialization.
+Both are updated when the inputs change and published to the mechanic registry, so ranking a
+candidate list is one vectorized pass over (distance, rank_score, vehicle_types).
+"""
+from math import log1p
+
+import numpy as np
+from django.db.models import Avg, Count, F, Q
+
+from . import registry as mechanic_registry
+from .models import Mechanic, Review, ServiceRequest
+
+VEHICLE_TYPE_BITS = {
+    'CAR': 1,
+    'MOTORCYCLE': 2,
+    'TRUCK': 4,
+}
+ALL_VEHICLE_TYPES = sum(VEHICLE_TYPE_BITS.values())
+# Keywords in Mechanic.specialization that mean a vehicle type is covered
+VEHICLE_TYPE_KEYWORDS = {
+    'CAR': ('car', 'four wheel', '4 wheel', 'sedan', 'suv', 'hatchback'),
+    'MOTORCYCLE': ('motorcycle', 'motorbike', 'bike', 'two wheel', '2 wheel', 'scooter'),
+    'TRUCK': ('truck', 'lorry', 'heavy', 'bus', 'commercial'),
+}
+GENERAL_KEYWORDS = ('general', 'all vehicle', 'any vehicle', 'multi')
+
+# Weights, expressed in "km of extra driving" like the dispatcher's costs
+RATING_WEIGHT = 2.0 # per star
+COMPLETED_JOBS_WEIGHT = 1.0 # per log step of completed jobs
+ACCEPT_LATENCY_WEIGHT = 0.5 # per minute of average acceptance delay
+MAX_ACCEPT_LATENCY_MINUTES = 30
+SPECIALIZATION_BONUS = 10.0
+DISTANCE_WEIGHT = 1.0
+
+
+def vehicle_type_mask(specialization):
+    """Returns the bitmask of vehicle types a free-text specialization covers."""
+    text = (specialization or '').lower()
+    if any(keyword in text for keyword in GENERAL_KEYWORDS):
+        return ALL_VEHICLE_TYPES
+    mask = 0
+    for vehicle_type, keywords in VEHICLE_TYPE_KEYWORDS.items():
+        if any(keyword in text for keyword in keywords):
+            mask |= VEHICLE_TYPE_BITS[vehicle_type]
+    return mask
+
+
+def static_score(rating, completed_jobs, avg_accept_seconds):
+    """Score of a mechanic independent of the request; higher is better."""
+    score = RATING_WEIGHT * float(rating or 0) + COMPLETED_JOBS_WEIGHT * log1p(completed_jobs or 0)
+    if avg_accept_seconds is not None:
+        score -= ACCEPT_LATENCY_WEIGHT * min(avg_accept_seconds / 60, MAX_ACCEPT_LATENCY_MINUTES)
+    return score
+
+
+def update_score(mechanic):
+    """Recomputes and saves rank_score and vehicle_types for one mechanic."""
+    mechanic.vehicle_types = vehicle_type_mask(mechanic.specialization)
+    mechanic.rank_score = static_score(mechanic.rating, mechanic.completed_jobs, mechanic.avg_accept_seconds)
+    Mechanic.objects.filter(pk=mechanic.pk).update(vehicle_types=mechanic.vehicle_types, rank_score=mechanic.rank_score)
+    mechanic_registry.publish(mechanic)
+
+
+def record_review(mechanic, rating):
+    """Folds a new review into the mechanic's average rating without re-aggregating every review."""
+    Mechanic.objects.filter(pk=mechanic.pk).update(
+        rating=(F('rating') * F('review_count') + rating) / (F('review_count') + 1),
+        review_count=F('review_count') + 1,
+    )
+    mechanic.refresh_from_db(fields=['rating', 'review_count'])
+    update_score(mechanic)
+
+
+def record_acceptance(mechanic, service_request):
+    """Folds the delay between creating and accepting a request into the mechanic's average."""
+    seconds = max((service_request.accepted_at - service_request.created_at).total_seconds(), 0.0)
+    Mechanic.objects.filter(pk=mechanic.pk, avg_accept_seconds__isnull=True).update(avg_accept_seconds=0.0)
+    Mechanic.objects.filter(pk=mechanic.pk).update(
+        avg_accept_seconds=(F('avg_accept_seconds') * F('accepted_jobs') + seconds) / (F('accepted_jobs') + 1),
+        accepted_jobs=F('accepted_jobs') + 1,
+    )
+    mechanic.refresh_from_db(fields=['avg_accept_seconds', 'accepted_jobs'])
+    update_score(mechanic)
+
+
+def record_completion(mechanic):
+    Mechanic.objects.filter(pk=mechanic.pk).update(completed_jobs=F('completed_jobs') + 1)
+    mechanic.refresh_from_db(fields=['completed_jobs'])
+    update_score(mechanic)
+
+
+def recompute_all():
+    """Rebuilds every mechanic's ranking inputs from reviews and service requests. Returns the count."""
+    reviews = {
+        row['service_request__mechanic']: row
+        for row in Review.objects.values('service_request__mechanic').annotate(avg=Avg('rating'), total=Count('id'))
+    }
+    jobs = {
+        row['mechanic']: row
+        for row in ServiceRequest.objects.filter(mechanic__isnull=False).values('mechanic').annotate(
+            completed=Count('id', filter=Q(status='COMPLETED')),
+            accepted=Count('id', filter=Q(accepted_at__isnull=False)),
+        )
+    }
+    latencies = {}
+    for mechanic_id, created_at, accepted_at in ServiceRequest.objects.filter(
+        mechanic__isnull=False, accepted_at__isnull=False
+    ).values_list('mechanic_id', 'created_at', 'accepted_at'):
+        latencies.setdefault(mechanic_id, []).append(max((accepted_at - created_at).total_seconds(), 0.0))
+
+    mechanics = list(Mechanic.objects.all())
+    for mechanic in mechanics:
+        review = reviews.get(mechanic.id)
+        job = jobs.get(mechanic.id, {})
+        mechanic.rating = round(review['avg'], 2) if review else 0
+        mechanic.review_count = review['total'] if review else 0
+        mechanic.completed_jobs = job.get('completed', 0)
+        mechanic.accepted_jobs = job.get('accepted', 0)
+        seconds = latencies.get(mechanic.id)
+        mechanic.avg_accept_seconds = sum(seconds) / len(seconds) if seconds else None
+        mechanic.vehicle_types = vehicle_type_mask(mechanic.specialization)
+        mechanic.rank_score = static_score(mechanic.rating, mechanic.completed_jobs, mechanic.avg_accept_seconds)
+    Mechanic.objects.bulk_update(mechanics, [
+        'rating', 'review_count', 'completed_jobs', 'accepted_jobs', 'avg_accept_seconds', 'vehicle_types', 'rank_score'
+    ], batch_size=500)
+    mechanic_registry.reload()
+    return len(mechanics)
+
+
+def combined_scores(distances_km, rank_scores, vehicle_masks, vehicle_type=None):
+    """Request-specific scores for arrays of candidates; higher is better."""
+    scores = np.asarray(rank_scores, dtype=np.float64) - DISTANCE_WEIGHT * np.asarray(distances_km, dtype=np.float64)
+    bit = VEHICLE_TYPE_BITS.get((vehicle_type or '').strip().upper())
+    if bit:
+        scores = scores + SPECIALIZATION_BONUS * ((np.asarray(vehicle_masks, dtype=np.int64) & bit) != 0)
+    return scores
+
+
+def rank_candidates(ranked, entries, vehicle_type=None, limit=None):
+    """
+    Re-orders (mechanic_id, km) pairs by combined score using registry entries.
+    Candidates missing from entries are dropped. Returns (mechanic_id, km) pairs, best first.
+    """
+    ranked = [(mechanic_id, km) for mechanic_id, km in ranked if mechanic_id in entries]
+    if not ranked:
+        return []
+    scores = combined_scores(
+        [km for _, km in ranked],
+        [entries[mechanic_id].get('rank_score', 0.0) for mechanic_id, _ in ranked],
+        [entries[mechanic_id].get('vehicle_types', 0) for mechanic_id, _ in ranked],
+        vehicle_type,
+    )
+    order = np.argsort(-scores, kind='stable')
+    if limit is not None:
+        order = order[:limit]
+    return [ranked[i] for i in order]
@@ -0,0 +1,239 @@
+"""
+Live registry of mechanic positions and availability used by the matching code.
+
+Reads are served from memory (or a shared cache) instead of querying the Mechanic table on
+every match. Views that change a mechanic's availability or coordinates call publish(), and
+the whole registry is reloaded from the database every REFRESH_SECONDS to heal any drift
+(admin edits, deleted mechanics, updates handled by other workers with the local backend).
+
+The backend is selected with settings.MECHANIC_REGISTRY['BACKEND']:
+- core.registry.LocalMemoryRegistry keeps everything in this process (single node / worker).
+- core.registry.CacheRegistry stores entries in a Django cache (e.g. Redis or Memcached),
+  so every gunicorn worker shares the same view of the fleet.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from . import nearby_cache
+from .geo import cell_for
+from .models import Mechanic
+
+
+class LocalMemoryRegistry:
+    def __init__(self, refresh_seconds=60, **options):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._cells = defaultdict(dict)
+        self._loaded_at = None
+
+    def is_fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds
+
+    def replace_all(self, entries):
+        cells = defaultdict(dict)
+        for entry in entries:
+            cells[entry['cell']][entry['id']] = entry
+        with self._lock:
+            self._entries = {entry['id']: entry for entry in entries}
+            self._cells = cells
+            self._loaded_at = time.monotonic()
+
+    def put(self, entry):
+        with self._lock:
+            previous = self._entries.get(entry['id'])
+            if previous and previous['cell'] != entry['cell']:
+                self._cells[previous['cell']].pop(entry['id'], None)
+            self._entries[entry['id']] = entry
+            self._cells[entry['cell']][entry['id']] = entry
+
+    def remove(self, mechanic_id):
+        with self._lock:
+            previous = self._entries.pop(mechanic_id, None)
+            if previous:
+                self._cells[previous['cell']].pop(mechanic_id, None)
+
+    def get_many(self, mechanic_ids):
+        entries = self._entries
+        return {mechanic_id: entries[mechanic_id] for mechanic_id in mechanic_ids if mechanic_id in entries}
+
+    def in_cells(self, cells):
+        found = []
+        for cell in cells:
+            bucket = self._cells.get(cell)
+            if bucket:
+                found.extend(bucket.values())
+        return found
+
+
+class CacheRegistry:
+    """
+    Registry stored in a Django cache so it can be shared between worker processes.
+    Each full reload writes a new generation of keys; older generations simply expire.
+
+    Every mechanic has its own entry key, so concurrent publishes from different workers never
+    overwrite each other. A cell is indexed as numbered slots holding mechanic ids plus a slot
+    counter: a mechanic entering a cell claims the next slot with an atomic incr, and slots of
+    mechanics that have since moved away or been removed are skipped on read, because only
+    entries whose current cell matches are returned. The slots are rebuilt on every reload.
+    """
+
+    def __init__(self, refresh_seconds=60, cache_alias='default', key_prefix='mechanic-registry', **options):
+        self.refresh_seconds = refresh_seconds
+        self.cache = caches[cache_alias]
+        self.key_prefix = key_prefix
+        # Entries outlive the refresh interval so readers never see a half-expired generation
+        self.entry_timeout = refresh_seconds * 10
+
+    def _generation(self):
+        return self.cache.get(f'{self.key_prefix}:generation')
+
+    def _cell_count_key(self, generation, cell):
+        return f'{self.key_prefix}:{generation}:cell:{cell}'
+
+    def _cell_slot_key(self, generation, cell, slot):
+        return f'{self.key_prefix}:{generation}:cell:{cell}:{slot}'
+
+    def _mechanic_key(self, generation, mechanic_id):
+        return f'{self.key_prefix}:{generation}:mechanic:{mechanic_id}'
+
+    def is_fresh(self):
+        return self.cache.get(f'{self.key_prefix}:loaded') is not None
+
+    def replace_all(self, entries):
+        generation = time.time_ns()
+        cells = defaultdict(list)
+        values = {}
+        for entry in entries:
+            cells[entry['cell']].append(entry['id'])
+            values[self._mechanic_key(generation, entry['id'])] = entry
+        for cell, mechanic_ids in cells.items():
+            values[self._cell_count_key(generation, cell)] = len(mechanic_ids)
+            for slot, mechanic_id in enumerate(mechanic_ids):
+                values[self._cell_slot_key(generation, cell, slot)] = mechanic_id
+        self.cache.set_many(values, timeout=self.entry_timeout)
+        self.cache.set(f'{self.key_prefix}:generation', generation, timeout=self.entry_timeout)
+        self.cache.set(f'{self.key_prefix}:loaded', True, timeout=self.refresh_seconds)
+
+    def _claim_slot(self, generation, cell):
+        count_key = self._cell_count_key(generation, cell)
+        try:
+            return self.cache.incr(count_key) - 1
+        except ValueError:
+            # First mechanic in this cell since the reload; add() lets only one worker create it
+            self.cache.add(count_key, 0, timeout=self.entry_timeout)
+            return self.cache.incr(count_key) - 1
+
+    def put(self, entry):
+        generation = self._generation()
+        if generation is None:
+            # Nothing loaded yet; the next read loads the current state from the database
+            return
+        mechanic_key = self._mechanic_key(generation, entry['id'])
+        previous = self.cache.get(mechanic_key)
+        self.cache.set(mechanic_key, entry, timeout=self.entry_timeout)
+        if previous is None or previous['cell'] != entry['cell']:
+            slot = self._claim_slot(generation, entry['cell'])
+            self.cache.set(self._cell_slot_key(generation, entry['cell'], slot), entry['id'], timeout=self.entry_timeout)
+
+    def remove(self, mechanic_id):
+        generation = self._generation()
+        if generation is None:
+            return
+        # The cell slot is left behind; readers skip ids without an entry
+        self.cache.delete(self._mechanic_key(generation, mechanic_id))
+
+    def get_many(self, mechanic_ids):
+        generation = self._generation()
+        if generation is None:
+            return {}
+        found = self.cache.get_many([self._mechanic_key(generation, mechanic_id) for mechanic_id in mechanic_ids])
+        return {entry['id']: entry for entry in found.values()}
+
+    def in_cells(self, cells):
+        generation = self._generation()
+        if generation is None:
+            return []
+        counts = self.cache.get_many([self._cell_count_key(generation, cell) for cell in cells])
+        slot_keys = [
+            self._cell_slot_key(generation, cell, slot)
+            for cell in cells
+            for slot in range(counts.get(self._cell_count_key(generation, cell), 0))
+        ]
+        mechanic_ids = set(self.cache.get_many(slot_keys).values()) if slot_keys else set()
+        wanted = set(cells)
+        return [entry for entry in self.get_many(mechanic_ids).values() if entry['cell'] in wanted]
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        options = dict(getattr(settings, 'MECHANIC_REGISTRY', {}))
+        backend = import_string(options.pop('BACKEND', 'core.registry.LocalMemoryRegistry'))
+        _registry = backend(**{key.lower(): value for key, value in options.items()})
+    return _registry
+
+
+def mechanic_entry(mechanic):
+    return {
+        'id': mechanic.id,
+        'user_id': mechanic.user_id,
+        'lat': float(mechanic.latitude),
+        'lng': float(mechanic.longitude),
+        'cell': cell_for(mechanic.latitude, mechanic.longitude),
+        'available': mechanic.available,
+        'base_fee': str(mechanic.base_fee),
+        'rank_score': mechanic.rank_score,
+        'vehicle_types': mechanic.vehicle_types,
+    }
+
+
+def reload():
+    """Loads every mechanic with coordinates from the database into the registry."""
+    mechanics = Mechanic.objects.filter(latitude__isnull=False, longitude__isnull=False).only(
+        'id', 'user_id', 'latitude', 'longitude', 'available', 'base_fee', 'rank_score', 'vehicle_types'
+    )
+    get_registry().replace_all([mechanic_entry(mechanic) for mechanic in mechanics])
+
+
+def ensure_fresh():
+    if not get_registry().is_fresh():
+        reload()
+
+
+def publish(mechanic):
+    """Records a mechanic's current availability and coordinates."""
+    registry = get_registry()
+    previous = registry.get_many([mechanic.id]).get(mechanic.id)
+    if mechanic.latitude is None or mechanic.longitude is None:
+        registry.remove(mechanic.id)
+        entry = None
+    else:
+        entry = mechanic_entry(mechanic)
+        registry.put(entry)
+
+    # Cached nearby lists only change when a mechanic enters or leaves a cell, or flips availability
+    old_cell = previous['cell'] if previous else ''
+    new_cell = entry['cell'] if entry else ''
+    if old_cell != new_cell or (previous and entry and previous['available'] != entry['available']):
+        nearby_cache.invalidate_cell(old_cell)
+        if new_cell != old_cell:
+            nearby_cache.invalidate_cell(new_cell)
+
+
+def entries_in_cells(cells):
+    ensure_fresh()
+    return get_registry().in_cells(cells)
+
+
+def get_entries(mechanic_ids):
+    ensure_fresh()
+    return get_registry().get_many(mechanic_ids)
@@ -0,0 +1,199 @@
+"""
+Tiered retention for mechanic location history.
+
+Hot tier: individual fixes for LOCATION_RETENTION['RAW_DAYS'] days, as raw LocationHistory rows
+or packed hourly LocationTrace blobs (see core.trace_store); the history endpoint reads only this.
+Warm tier: per-minute LocationRollup rows until MINUTE_DAYS, then per-hour rollups kept indefinitely.
+Expired fixes, raw and packed, are written to gzip CSV files in ARCHIVE_DIR before they are deleted.
+
+Work is done one day at a time, each day in its own transaction, and cutoffs are aligned to the
+hour so no minute or hour bucket is ever split between two runs.
+"""
+import csv
+import gzip
+import heapq
+import os
+from itertools import repeat
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from . import trace_codec, trace_store
+from .models import LocationHistory, LocationRollup, LocationTrace
+
+DEFAULT_RAW_DAYS = 7
+DEFAULT_MINUTE_DAYS = 90
+
+
+def retention_settings():
+    options = getattr(settings, 'LOCATION_RETENTION', {})
+    return {
+        'raw_days': options.get('RAW_DAYS', DEFAULT_RAW_DAYS),
+        'minute_days': options.get('MINUTE_DAYS', DEFAULT_MINUTE_DAYS),
+        'archive_dir': options.get('ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive', 'location_history')),
+    }
+
+
+def hot_tier_start(now=None):
+    """Oldest timestamp whose individual fixes are still guaranteed to be kept."""
+    return (now or timezone.now()) - timedelta(days=retention_settings()['raw_days'])
+
+
+def floor_to_hour(value):
+    return value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def day_ranges(start, end):
+    """Yields consecutive [day_start, day_end) UTC ranges covering [start, end)."""
+    day_start = start.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    while day_start < end:
+        day_end = min(day_start + timedelta(days=1), end)
+        yield max(day_start, start), day_end
+        day_start += timedelta(days=1)
+
+
+def merge_rollups(resolution, start, end, buckets):
+    """
+    Stores {(mechanic_id, bucket_start): (latitude, longitude, count)} as rollups, averaging
+    with any rollup already stored for the same bucket (e.g. from late uploaded fixes).
+    """
+    existing = {
+        (rollup.mechanic_id, rollup.bucket_start): rollup
+        for rollup in LocationRollup.objects.filter(resolution=resolution, bucket_start__gte=start, bucket_start__lt=end)
+    }
+    created, updated = [], []
+    for (mechanic_id, bucket_start), (latitude, longitude, count) in buckets.items():
+        rollup = existing.get((mechanic_id, bucket_start))
+        if rollup is None:
+            created.append(LocationRollup(
+                mechanic_id=mechanic_id, resolution=resolution, bucket_start=bucket_start,
+                latitude=latitude, longitude=longitude, point_count=count,
+            ))
+        else:
+            total = rollup.point_count + count
+            rollup.latitude = (rollup.latitude * rollup.point_count + latitude * count) / total
+            rollup.longitude = (rollup.longitude * rollup.point_count + longitude * count) / total
+            rollup.point_count = total
+            updated.append(rollup)
+    LocationRollup.objects.bulk_create(created, batch_size=1000)
+    LocationRollup.objects.bulk_update(updated, ['latitude', 'longitude', 'point_count'], batch_size=1000)
+    return len(created) + len(updated)
+
+
+def day_points(rows, traces):
+    """(timestamp, mechanic_id, latitude, longitude) of every raw row and packed fix, in time order."""
+    streams = [rows.order_by('timestamp', 'id').values_list('timestamp', 'mechanic_id', 'latitude', 'longitude').iterator(chunk_size=5000)]
+    for trace in traces:
+        times, lats, lngs = trace_codec.decode(trace.data)
+        streams.append(zip(map(trace_store.from_ms, times.tolist()), repeat(trace.mechanic_id), lats.tolist(), lngs.tolist()))
+    return heapq.merge(*streams)
+
+
+def open_new_archive(archive_dir, name):
+    """
+    Creates a new gzip CSV archive for writing. Returns (path, file). A rerun over the same range
+    (e.g. for late uploaded fixes) gets a numbered name instead of overwriting the earlier file.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    suffix = 0
+    while True:
+        try:
+            return path, gzip.open(path, 'xt', newline='')
+        except FileExistsError:
+            suffix += 1
+            path = os.path.join(archive_dir, f"{name}_{suffix}.csv.gz")
+
+
+def archive_points(points, archive_dir, start, end):
+    """
+    Writes points to a gzip CSV file named after the range and averages them per mechanic and
+    minute on the way. Returns (path, point count, {(mechanic_id, minute): (latitude, longitude, count)}).
+    """
+    path, archive = open_new_archive(archive_dir, f"location_history_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}")
+    sums = {}
+    written = 0
+    with archive:
+        writer = csv.writer(archive)
+        writer.writerow(['mechanic_id', 'latitude', 'longitude', 'timestamp'])
+        for timestamp, mechanic_id, latitude, longitude in points:
+            writer.writerow([mechanic_id, latitude, longitude, timestamp.isoformat()])
+            written += 1
+            bucket = sums.setdefault((mechanic_id, timestamp.astimezone(dt_timezone.utc).replace(second=0, microsecond=0)), [0.0, 0.0, 0])
+            bucket[0] += latitude
+            bucket[1] += longitude
+            bucket[2] += 1
+    buckets = {key: (lat_sum / count, lng_sum / count, count) for key, (lat_sum, lng_sum, count) in sums.items()}
+    return path, written, buckets
+
+
+def expire_raw(cutoff, archive_dir):
+    """
+    Archives raw rows and packed traces older than cutoff, rolls them up into per-minute
+    rollups and deletes them. Returns stats.
+    """
+    stats = {'raw_archived': 0, 'traces_expired': 0, 'minute_rollups': 0, 'archives': []}
+    oldest_times = [
+        LocationHistory.objects.filter(timestamp__lt=cutoff).aggregate(oldest=Min('timestamp'))['oldest'],
+        LocationTrace.objects.filter(hour_start__lt=cutoff).aggregate(oldest=Min('hour_start'))['oldest'],
+    ]
+    oldest_times = [oldest for oldest in oldest_times if oldest is not None]
+    if not oldest_times:
+        return stats
+    # Aligned to the hour so each day's range covers whole packed hours
+    for start, end in day_ranges(floor_to_hour(min(oldest_times)), cutoff):
+        with transaction.atomic():
+            rows = LocationHistory.objects.filter(timestamp__gte=start, timestamp__lt=end)
+            traces = list(LocationTrace.objects.filter(hour_start__gte=start, hour_start__lt=end))
+            if not traces and not rows.exists():
+                continue
+            path, archived, buckets = archive_points(day_points(rows, traces), archive_dir, start, end)
+            stats['minute_rollups'] += merge_rollups('MINUTE', start, end, buckets)
+            rows.delete()
+            stats['traces_expired'] += LocationTrace.objects.filter(id__in=[trace.id for trace in traces]).delete()[0]
+            stats['raw_archived'] += archived
+            stats['archives'].append(path)
+    return stats
+
+
+def compact_minutes(cutoff):
+    """Folds per-minute rollups older than cutoff into per-hour rollups. Returns stats."""
+    stats = {'minute_compacted': 0, 'hour_rollups': 0}
+    minutes = LocationRollup.objects.filter(resolution='MINUTE', bucket_start__lt=cutoff)
+    oldest = minutes.aggregate(oldest=Min('bucket_start'))['oldest']
+    if oldest is None:
+        return stats
+    for start, end in day_ranges(oldest, cutoff):
+        with transaction.atomic():
+            rows = minutes.filter(bucket_start__gte=start, bucket_start__lt=end)
+            buckets = {
+                (row['mechanic_id'], row['bucket']): (row['latitude_sum'] / row['count'], row['longitude_sum'] / row['count'], row['count'])
+                for row in rows.annotate(bucket=TruncHour('bucket_start', tzinfo=dt_timezone.utc))
+                .values('mechanic_id', 'bucket')
+                .annotate(
+                    latitude_sum=Sum(F('latitude') * F('point_count')),
+                    longitude_sum=Sum(F('longitude') * F('point_count')),
+                    count=Sum('point_count'),
+                )
+                .order_by()
+            }
+            if not buckets:
+                continue
+            stats['hour_rollups'] += merge_rollups('HOUR', start, end, buckets)
+            stats['minute_compacted'] += rows.delete()[0]
+    return stats
+
+
+def apply_retention(now=None, raw_days=None, minute_days=None, archive_dir=None):
+    """Runs both retention steps with the configured (or given) windows. Returns combined stats."""
+    options = retention_settings()
+    now = now or timezone.now()
+    raw_days = options['raw_days'] if raw_days is None else raw_days
+    minute_days = options['minute_days'] if minute_days is None else minute_days
+    stats = expire_raw(floor_to_hour(now - timedelta(days=raw_days)), archive_dir or options['archive_dir'])
+    stats.update(compact_minutes(floor_to_hour(now - timedelta(days=minute_days))))
+    return stats
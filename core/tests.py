@@ -0,0 +1,178 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+
+import numpy as np
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import emails, fanout, geocoding, outbox, registry, trace_store
+from core.models import (
+    EmergencyRequest, LocationHistory, Mechanic, Notification, OutboxEvent, Payment, ServiceRequest, User,
+)
+
+
+def make_mechanic(username='mechanic', **fields):
+    user = User.objects.create_user(username=username, password='password', is_mechanic=True)
+    return Mechanic.objects.create(
+        user=user, specialization=fields.pop('specialization', 'Car repair'), experience_years=3,
+        workshop_address='Workshop', **fields,
+    )
+
+
+class SpeedGridTraceTests(TestCase):
+    def build_grid(self, path):
+        call_command('build_speed_grid', output=path, min_samples=1, stdout=open(os.devnull, 'w'))
+        with np.load(path) as data:
+            return data['keys'], data['speeds']
+
+    def test_grid_is_unchanged_by_packing(self):
+        mechanic = make_mechanic()
+        start = trace_store.floor_to_hour(timezone.now()) - timedelta(days=2)
+        # Two hours of driving north at ~36 km/h with a fix every 30 seconds
+        LocationHistory.objects.bulk_create([
+            LocationHistory(mechanic=mechanic, latitude=12.9 + index * 0.0027, longitude=77.59, timestamp=start + timedelta(seconds=30 * index))
+            for index in range(240)
+        ])
+
+        with tempfile.TemporaryDirectory() as directory:
+            raw_keys, raw_speeds = self.build_grid(os.path.join(directory, 'raw.npz'))
+            traces, packed = trace_store.pack_hours(None, timezone.now())
+            self.assertEqual((traces, packed), (2, 240))
+            self.assertFalse(LocationHistory.objects.exists())
+            packed_keys, packed_speeds = self.build_grid(os.path.join(directory, 'packed.npz'))
+
+        self.assertGreater(len(raw_keys), 0)
+        np.testing.assert_array_equal(packed_keys, raw_keys)
+        np.testing.assert_allclose(packed_speeds, raw_speeds, rtol=1e-3)
+
+
+class PushNotificationTests(TestCase):
+    def test_bulk_notifications_queue_one_push_per_payload(self):
+        users = [User.objects.create_user(username=f'user{index}', password='password') for index in range(3)]
+        notifications = Notification.bulk_create_notifications([
+            Notification(recipient=user, notification_type='SERVICE_REQUEST', title="New Request Received", message="Near you.")
+            for user in users[:2]
+        ] + [
+            Notification(recipient=users[2], notification_type='EMERGENCY', title="Emergency", message="Hurry.")
+        ])
+
+        outbox.push_notifications(notifications)
+
+        events = OutboxEvent.objects.filter(event_type='PUSH').order_by('id')
+        self.assertEqual([sorted(event.payload['user_ids']) for event in events], [[users[0].id, users[1].id], [users[2].id]])
+        self.assertEqual(events[0].payload['data'], {'notification_type': 'SERVICE_REQUEST'})
+
+    def test_push_data_values_are_strings(self):
+        event = outbox.push([1], "Title", "Body", {'service_request_id': 42, 'urgent': True})
+        self.assertEqual(event.payload['data'], {'service_request_id': '42', 'urgent': 'True'})
+
+
+class FanoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.near = make_mechanic('near', latitude=12.97, longitude=77.59)
+        self.far = make_mechanic('far', latitude=19.07, longitude=72.87)
+        registry.reload()
+        self.user = User.objects.create_user(username='customer', password='password')
+
+    def offered_to(self):
+        return set(Notification.objects.filter(notification_type='SERVICE_REQUEST').values_list('recipient_id', flat=True))
+
+    def test_request_without_coordinates_waits_for_geocoding(self):
+        service_request = ServiceRequest.objects.create(
+            user=self.user, vehicle_type='CAR', issue_description='Flat tyre', location='MG Road',
+        )
+        self.assertEqual(fanout.notify_mechanics(service_request), 0)
+        self.assertEqual(self.offered_to(), set())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            geocoding.apply_coordinates('SERVICE_REQUEST', service_request.id, 12.98, 77.6)
+        self.assertEqual(self.offered_to(), {self.near.user_id})
+
+    def test_unknown_vehicle_type_is_still_scoped_by_area(self):
+        service_request = ServiceRequest.objects.create(
+            user=self.user, vehicle_type='Hovercraft', issue_description='Engine', location='MG Road',
+            latitude=12.98, longitude=77.6,
+        )
+        with self.assertLogs('core.fanout', level='WARNING'):
+            self.assertEqual(fanout.notify_mechanics(service_request), 1)
+        self.assertEqual(self.offered_to(), {self.near.user_id})
+
+
+class EmergencyAcceptTests(TestCase):
+    def test_acceptance_notifies_the_user_through_the_outbox(self):
+        user = User.objects.create_user(username='driver', password='password')
+        mechanic = make_mechanic(latitude=12.97, longitude=77.59)
+        emergency_request = EmergencyRequest.objects.create(user=user, latitude=12.97, longitude=77.59)
+        self.client.force_login(mechanic.user)
+
+        response = self.client.post(reverse('core:accept_emergency_request', args=[emergency_request.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Notification.objects.filter(recipient=user).exists())
+        self.assertEqual(OutboxEvent.objects.filter(event_type='NOTIFICATION').count(), 1)
+        outbox.process_events()
+        notification = Notification.objects.get(recipient=user)
+        self.assertEqual(notification.title, "Emergency Request Accepted by mechanic")
+
+
+class PaymentReceiptEmailTests(TestCase):
+    def test_receipt_has_plain_text_body_and_html_alternative(self):
+        user = User.objects.create_user(username='driver', password='password', email='driver@example.com')
+        service_request = ServiceRequest.objects.create(
+            user=user, mechanic=make_mechanic(), vehicle_type='CAR', issue_description='Flat tyre', location='MG Road'
+        )
+        payment = Payment.objects.create(
+            service_request=service_request, amount=500, service_charge=500, tax=90, total_amount=590, payment_status='PAID'
+        )
+
+        emails.send_payment_receipt_email(payment)
+
+        message = mail.outbox[0]
+        self.assertIn('Total Amount Paid: Rs.590', message.body)
+        self.assertEqual(message.alternatives[0][1], 'text/html')
+        self.assertEqual(message.attachments[0][0], f'payment_receipt_{payment.id}.pdf')
+
+
+@override_settings(LOCATION_INGEST_FLUSH_SECONDS=0)
+class StatusNotificationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='driver', password='password')
+        self.mechanic = make_mechanic(latitude=12.97, longitude=77.59)
+        self.service_request = ServiceRequest.objects.create(
+            user=self.user, mechanic=self.mechanic, vehicle_type='CAR', issue_description='Flat tyre',
+            location='MG Road', latitude=12.98, longitude=77.6,
+        )
+        self.client.force_login(self.mechanic.user)
+
+    def status_notifications(self):
+        outbox.process_events()
+        return Notification.objects.filter(recipient=self.user, notification_type='STATUS_UPDATE')
+
+    def test_location_ping_does_not_notify(self):
+        self.service_request.status = 'ACCEPTED'
+        self.service_request.save()
+        self.status_notifications().delete()
+
+        response = self.client.post(
+            reverse('core:update_mechanic_location'), json.dumps({'latitude': 12.975, 'longitude': 77.595}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.service_request.refresh_from_db()
+        self.assertEqual(self.service_request.mechanic_latitude, 12.975)
+        self.assertFalse(self.status_notifications().exists())
+
+    def test_status_transition_notifies_once(self):
+        self.client.post(reverse('core:service_request_detail', args=[self.service_request.id]), {'action': 'accept'})
+
+        self.service_request.refresh_from_db()
+        self.assertEqual(self.service_request.status, 'ACCEPTED')
+        self.assertEqual(self.status_notifications().count(), 1)
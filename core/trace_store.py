@@ -0,0 +1,152 @@
+"""
+Hourly packed location traces, replacing raw LocationHistory rows for completed hours.
+
+pack_hours() packs completed hours of raw fixes into one LocationTrace blob per mechanic per
+hour and deletes the rows it packed. Fixes uploaded late for an hour that is already packed
+stay raw until the next run merges them into that hour's trace. history_points() is what the
+history endpoint reads: it merges the packed hours of the requested window with whatever raw
+rows remain (the current hour and late fixes). fleet_points() gives bulk readers (the ETA speed
+grid) every kept fix the same way. Expired traces are archived and rolled up with the raw rows
+by core.retention.
+"""
+import heapq
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import trace_codec
+from .models import LocationHistory, LocationTrace
+
+DELETE_BATCH_SIZE = 1000
+
+
+def floor_to_hour(value):
+    return value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def to_ms(value):
+    return int(value.timestamp() * 1000)
+
+
+def from_ms(value):
+    return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+
+
+def pack_hours(since, before):
+    """
+    Packs raw fixes in [since, before) into hourly traces, both rounded down to the hour, and
+    deletes the packed rows in the same transaction. since=None packs every raw fix before
+    `before`, which also picks up late fixes for hours packed earlier. Existing traces for the
+    same hour are merged, so rerunning a window is harmless. Returns (traces written, fixes packed).
+    """
+    before = floor_to_hour(before)
+    rows = LocationHistory.objects.filter(timestamp__lt=before)
+    if since is not None:
+        since = floor_to_hour(since)
+        rows = rows.filter(timestamp__gte=since)
+    with transaction.atomic():
+        groups = {}
+        packed_ids = []
+        for row_id, mechanic_id, timestamp, latitude, longitude in rows.order_by('mechanic_id', 'timestamp').values_list(
+            'id', 'mechanic_id', 'timestamp', 'latitude', 'longitude'
+        ).iterator(chunk_size=10000):
+            times, lats, lngs = groups.setdefault((mechanic_id, floor_to_hour(timestamp)), ([], [], []))
+            times.append(to_ms(timestamp))
+            lats.append(latitude)
+            lngs.append(longitude)
+            packed_ids.append(row_id)
+        if not groups:
+            return 0, 0
+
+        existing = {
+            (trace.mechanic_id, trace.hour_start): trace
+            for trace in LocationTrace.objects.filter(
+                mechanic_id__in={mechanic_id for mechanic_id, _ in groups},
+                hour_start__in={hour_start for _, hour_start in groups},
+            )
+        }
+        created, updated = [], []
+        for (mechanic_id, hour_start), (times, lats, lngs) in groups.items():
+            trace = existing.get((mechanic_id, hour_start))
+            if trace is None:
+                data = trace_codec.encode(times, lats, lngs)
+                trace = LocationTrace(mechanic_id=mechanic_id, hour_start=hour_start, data=data)
+                created.append(trace)
+            else:
+                trace.data = trace_codec.merge(trace.data, times, lats, lngs)
+                updated.append(trace)
+            trace.point_count = trace_codec.HEADER.unpack_from(trace.data)[2]
+        LocationTrace.objects.bulk_create(created, batch_size=500)
+        LocationTrace.objects.bulk_update(updated, ['data', 'point_count'], batch_size=500)
+        # By id: rows inserted for the same hours since they were read are left for the next run
+        for start in range(0, len(packed_ids), DELETE_BATCH_SIZE):
+            LocationHistory.objects.filter(id__in=packed_ids[start:start + DELETE_BATCH_SIZE]).delete()
+    return len(created) + len(updated), len(packed_ids)
+
+
+def trace_points(traces, since_ms, until_ms, after):
+    for trace in traces:
+        times, lats, lngs = trace_codec.decode(trace.data)
+        in_window = (times >= since_ms) & (times <= until_ms)
+        if after is not None:
+            in_window &= times > to_ms(after[0])
+        for time_ms, latitude, longitude in zip(times[in_window].tolist(), lats[in_window].tolist(), lngs[in_window].tolist()):
+            # Packed fixes have no row id; 0 sorts them before raw rows with the same timestamp
+            yield from_ms(time_ms), 0, latitude, longitude
+
+
+def history_points(mechanic_id, since, until, after=None, limit=None):
+    """
+    Returns up to limit (id, latitude, longitude, timestamp) tuples for a mechanic in
+    [since, until], ordered by (timestamp, id) and strictly after the (timestamp, id) cursor.
+    """
+    traces = list(
+        LocationTrace.objects.filter(mechanic_id=mechanic_id, hour_start__gte=floor_to_hour(since), hour_start__lte=until)
+        .order_by('hour_start')
+    )
+    # Packed rows are deleted, so what is left raw is the unpacked hours plus late fixes
+    raw = LocationHistory.objects.filter(mechanic_id=mechanic_id, timestamp__gte=since, timestamp__lte=until)
+    if after is not None:
+        raw = raw.filter(Q(timestamp__gt=after[0]) | Q(timestamp=after[0], id__gt=after[1]))
+    raw = raw.order_by('timestamp', 'id').values_list('timestamp', 'id', 'latitude', 'longitude')
+    if limit is not None:
+        raw = raw[:limit]
+
+    merged = heapq.merge(trace_points(traces, to_ms(since), to_ms(until), after), raw.iterator(chunk_size=5000))
+    points = []
+    for timestamp, row_id, latitude, longitude in merged:
+        points.append((row_id, latitude, longitude, timestamp))
+        if limit is not None and len(points) >= limit:
+            break
+    return points
+
+
+def fleet_points():
+    """
+    Every kept fix, packed and raw, as (mechanic_ids, latitudes, longitudes, epoch seconds)
+    arrays sorted by mechanic and time, for bulk consumers such as the speed-grid builder.
+    """
+    mechanic_ids, times, lats, lngs = [], [], [], []
+    for mechanic_id, data in LocationTrace.objects.values_list('mechanic_id', 'data').iterator(chunk_size=500):
+        trace_times, trace_lats, trace_lngs = trace_codec.decode(data)
+        mechanic_ids.append(np.full(len(trace_times), mechanic_id, dtype=np.int64))
+        times.append(trace_times)
+        lats.append(trace_lats)
+        lngs.append(trace_lngs)
+    raw = list(LocationHistory.objects.values_list('mechanic_id', 'timestamp', 'latitude', 'longitude').iterator(chunk_size=5000))
+    if raw:
+        mechanic_ids.append(np.array([row[0] for row in raw], dtype=np.int64))
+        times.append(np.array([to_ms(row[1]) for row in raw], dtype=np.int64))
+        lats.append(np.array([row[2] for row in raw], dtype=np.float64))
+        lngs.append(np.array([row[3] for row in raw], dtype=np.float64))
+    if not mechanic_ids:
+        empty = np.array([], dtype=np.float64)
+        return np.array([], dtype=np.int64), empty, empty, empty
+
+    mechanic_ids = np.concatenate(mechanic_ids)
+    times = np.concatenate(times)
+    order = np.lexsort((times, mechanic_ids))
+    return mechanic_ids[order], np.concatenate(lats)[order], np.concatenate(lngs)[order], times[order] / 1000
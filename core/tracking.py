@@ -0,0 +1,221 @@
+"""
+Live mechanic positions for service request tracking.
+
+Every accepted location ping is published to the Django cache as the mechanic's latest
+position with a sequence number (the fix time in milliseconds). Watchers of a service request
+read that one cache key instead of the database: the SSE stream pushes a new event only when
+the sequence changes, and the polling endpoint derives its ETag from it and can long-poll on it.
+With the default per-process cache a process only sees the pings it handled, so readers also
+compare with the coordinates the ingest flush stored on the request and serve the newer one;
+configure a shared cache (CACHES) to see every ping as soon as it arrives.
+
+Each published position also carries the mechanic's smoothed speed (an exponential moving
+average over successive fixes). On every ingest flush update_request_states() turns that into
+a tracking state per active service request (distance remaining, speed and ETA), so viewers
+read the figures precomputed instead of recomputing them per request.
+"""
+import time
+
+from django.core.cache import caches
+from django.utils import timezone
+
+from . import eta
+from .distance import elementwise_haversine_km
+from .models import ServiceRequest
+
+KEY_PREFIX = 'mechanic-position'
+STATE_KEY_PREFIX = 'service-request-tracking'
+# Positions outlive the ingest flush so a watcher never misses the latest fix
+POSITION_TIMEOUT = 60 * 60
+LONG_POLL_INTERVAL = 0.5
+ACTIVE_STATUSES = ['ACCEPTED', 'IN_PROGRESS']
+
+# Weight of the newest fix in the smoothed speed
+SPEED_SMOOTHING = 0.3
+# Faster than this between two fixes is a GPS jump, not driving
+MAX_PLAUSIBLE_SPEED_KMH = 150
+# After a gap this long the average restarts from the newest fix
+SPEED_RESET_SECONDS = 5 * 60
+# Below this the mechanic is treated as stopped and the ETA comes from the speed grid
+MIN_MOVING_SPEED_KMH = 5
+
+
+def get_cache():
+    return caches['default']
+
+
+def position_key(mechanic_id):
+    return f'{KEY_PREFIX}:{mechanic_id}'
+
+
+def state_key(service_request_id):
+    return f'{STATE_KEY_PREFIX}:{service_request_id}'
+
+
+def smoothed_speed(previous, latitude, longitude, seq):
+    """Exponential moving average of the speed in km/h, updated with the move since previous."""
+    if previous is None:
+        return None
+    seconds = (seq - previous['seq']) / 1000
+    if seconds <= 0:
+        return previous.get('speed_kmh')
+    km = float(elementwise_haversine_km([previous['latitude']], [previous['longitude']], [latitude], [longitude])[0])
+    speed = km / (seconds / 3600)
+    if speed > MAX_PLAUSIBLE_SPEED_KMH:
+        return previous.get('speed_kmh')
+    if previous.get('speed_kmh') is None or seconds > SPEED_RESET_SECONDS:
+        return speed
+    return previous['speed_kmh'] + SPEED_SMOOTHING * (speed - previous['speed_kmh'])
+
+
+def publish_position(mechanic_id, latitude, longitude, recorded_at):
+    seq = int(recorded_at.timestamp() * 1000)
+    position = {
+        'seq': seq,
+        'latitude': latitude,
+        'longitude': longitude,
+        'recorded_at': recorded_at.isoformat(),
+        'speed_kmh': smoothed_speed(get_position(mechanic_id), latitude, longitude, seq),
+    }
+    get_cache().set(position_key(mechanic_id), position, timeout=POSITION_TIMEOUT)
+    return position
+
+
+def get_position(mechanic_id):
+    """Returns the mechanic's latest published position dict, or None."""
+    return get_cache().get(position_key(mechanic_id))
+
+
+async def aget_position(mechanic_id):
+    return await get_cache().aget(position_key(mechanic_id))
+
+
+def stored_position(service_request):
+    """The coordinates the last ingest flush stored on the request, sequenced by its updated_at."""
+    if service_request.mechanic_latitude is None or service_request.mechanic_longitude is None:
+        return None
+    return {
+        'seq': int(service_request.updated_at.timestamp() * 1000),
+        'latitude': service_request.mechanic_latitude,
+        'longitude': service_request.mechanic_longitude,
+        'recorded_at': service_request.updated_at.isoformat(),
+    }
+
+
+def latest_position(published, stored):
+    """
+    The newer of a published and a stored position. Without a shared cache each process only
+    sees the pings it handled itself, so a published position older than what another process
+    has flushed to the request since must not win.
+    """
+    if published is None or (stored is not None and stored['seq'] > published['seq']):
+        return stored
+    return published
+
+
+def current_position(service_request):
+    """
+    The assigned mechanic's latest position for a service request: the published one, unless
+    the coordinates stored on the request are newer.
+    """
+    return latest_position(get_position(service_request.mechanic_id), stored_position(service_request))
+
+
+def location_etag(service_request, position, state=None):
+    seq = position['seq'] if position else 0
+    state_seq = state['updated'] if state else 0
+    return f'"{service_request.id}-{service_request.status}-{seq}-{state_seq}"'
+
+
+def eta_from_speed(distance_km, speed_kmh):
+    return distance_km * eta.ROAD_DETOUR_FACTOR / speed_kmh * 60
+
+
+def update_request_states(positions):
+    """
+    Recomputes the tracking state of the active service requests of the mechanics in
+    {mechanic_id: (latitude, longitude, recorded_at)}, with one query for all of them.
+    Returns the number of states written.
+    """
+    if not positions:
+        return 0
+    rows = list(
+        ServiceRequest.objects.filter(
+            mechanic_id__in=list(positions), status__in=ACTIVE_STATUSES,
+            latitude__isnull=False, longitude__isnull=False,
+        ).values_list('id', 'mechanic_id', 'latitude', 'longitude')
+    )
+    if not rows:
+        return 0
+    published = get_cache().get_many([position_key(mechanic_id) for mechanic_id in positions])
+    fixes = []
+    for _, mechanic_id, _, _ in rows:
+        # The published position may be newer than the flushed one; prefer it
+        position = published.get(position_key(mechanic_id))
+        if position is None:
+            latitude, longitude, recorded_at = positions[mechanic_id]
+            position = {'seq': int(recorded_at.timestamp() * 1000), 'latitude': latitude, 'longitude': longitude, 'speed_kmh': None}
+        fixes.append(position)
+
+    from_lats = [fix['latitude'] for fix in fixes]
+    from_lngs = [fix['longitude'] for fix in fixes]
+    to_lats = [row[2] for row in rows]
+    to_lngs = [row[3] for row in rows]
+    distances = elementwise_haversine_km(from_lats, from_lngs, to_lats, to_lngs)
+    grid_minutes = eta.route_eta_minutes(from_lats, from_lngs, to_lats, to_lngs)
+
+    updated = int(timezone.now().timestamp() * 1000)
+    states = {}
+    for (request_id, _, _, _), fix, distance_km, minutes in zip(rows, fixes, distances, grid_minutes):
+        speed_kmh = fix.get('speed_kmh')
+        if speed_kmh is not None and speed_kmh >= MIN_MOVING_SPEED_KMH:
+            minutes = eta_from_speed(distance_km, speed_kmh)
+        states[state_key(request_id)] = {
+            'seq': fix['seq'],
+            'updated': updated,
+            'distance_km': round(float(distance_km), 2),
+            'speed_kmh': round(speed_kmh, 1) if speed_kmh is not None else None,
+            'eta_minutes': round(float(minutes)),
+        }
+    get_cache().set_many(states, timeout=POSITION_TIMEOUT)
+    return len(states)
+
+
+def get_request_state(service_request_id):
+    """Returns the precomputed {'distance_km', 'speed_kmh', 'eta_minutes', ...} state, or None."""
+    return get_cache().get(state_key(service_request_id))
+
+
+async def aget_request_state(service_request_id):
+    return await get_cache().aget(state_key(service_request_id))
+
+
+def tracking_fields(service_request, position, state):
+    """
+    The distance, speed and ETA served to viewers: the precomputed state when there is one,
+    otherwise a one-off estimate from the position (e.g. before the first flush).
+    """
+    if state is not None:
+        return {key: state[key] for key in ('distance_km', 'speed_kmh', 'eta_minutes')}
+    fields = {'distance_km': None, 'speed_kmh': None, 'eta_minutes': None}
+    if position and service_request.latitude is not None and service_request.longitude is not None:
+        fields['distance_km'] = round(float(elementwise_haversine_km(
+            [position['latitude']], [position['longitude']], [service_request.latitude], [service_request.longitude]
+        )[0]), 2)
+        fields['eta_minutes'] = round(float(eta.eta_minutes(
+            service_request.latitude, service_request.longitude, [position['latitude']], [position['longitude']]
+        )[0]))
+    return fields
+
+
+def wait_for_position(mechanic_id, seq, timeout):
+    """Blocks until the mechanic publishes a position newer than seq, or timeout seconds pass."""
+    deadline = time.monotonic() + timeout
+    while True:
+        position = get_position(mechanic_id)
+        if position is not None and (seq is None or position['seq'] > seq):
+            return position
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(LONG_POLL_INTERVAL, remaining))
@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+
+from . import tracking
+from .models import ServiceRequest
+
+ACTIVE_STATUSES = ('ACCEPTED', 'IN_PROGRESS')
+# How often the stream checks the tracking cache; no database or session work is involved
+STREAM_POLL_SECONDS = 1.0
+STREAM_HEARTBEAT_SECONDS = 15
+# How often the stream re-reads the request row: its status, and the coordinates flushed by
+# other processes, whose pings a per-process cache never sees
+STREAM_REFRESH_SECONDS = 5
+# Streams are closed after this long; EventSource reconnects and resumes from Last-Event-ID
+STREAM_MAX_SECONDS = 300
+STREAM_RETRY_MS = 5000
+
+
+def stream_target(request, service_request_id):
+    """Runs the session, permission and status checks once per stream. Returns (service_request, error)."""
+    if not request.user.is_authenticated:
+        return None, JsonResponse({'success': False, 'error': 'Authentication required.'}, status=401)
+    service_request = ServiceRequest.objects.select_related('mechanic').filter(pk=service_request_id).first()
+    if service_request is None:
+        return None, JsonResponse({'success': False, 'error': 'Service request not found.'}, status=404)
+    if not (request.user.id == service_request.user_id or
+            (service_request.mechanic and request.user.id == service_request.mechanic.user_id)):
+        return None, JsonResponse({'success': False, 'error': 'Permission denied.'}, status=403)
+    if not service_request.mechanic or service_request.status not in ACTIVE_STATUSES:
+        return None, JsonResponse({'success': False, 'error': 'Mechanic not assigned or service not in progress.'}, status=404)
+    return service_request, None
+
+
+def refreshed_request(service_request_id):
+    return ServiceRequest.objects.filter(pk=service_request_id).only(
+        'id', 'status', 'mechanic_id', 'latitude', 'longitude', 'mechanic_latitude', 'mechanic_longitude', 'updated_at',
+    ).first()
+
+
+def position_event(service_request, position, state, status):
+    payload = {
+        'mechanic_latitude': position['latitude'],
+        'mechanic_longitude': position['longitude'],
+        'status': status,
+        **tracking.tracking_fields(service_request, position, state),
+    }
+    return f"id: {position['seq']}\nevent: position\ndata: {json.dumps(payload)}\n\n"
+
+
+def event_version(position, state):
+    """Grows when either the position or its precomputed tracking state changes."""
+    return position['seq'], state['updated'] if state else 0
+
+
+async def mechanic_location_stream(request, service_request_id):
+    """Server-Sent Events stream that pushes the assigned mechanic's position whenever it changes."""
+    service_request, error = await sync_to_async(stream_target)(request, service_request_id)
+    if error is not None:
+        return error
+
+    mechanic_id = service_request.mechanic_id
+    try:
+        last_seq = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_seq = None
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        started = last_sent = loop.time()
+        next_refresh = started + STREAM_REFRESH_SECONDS
+        request_row = service_request
+        status = service_request.status
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+
+        stored = tracking.stored_position(request_row)
+        position = tracking.latest_position(await tracking.aget_position(mechanic_id), stored)
+        state = await tracking.aget_request_state(service_request.id)
+        version = event_version(position, state) if position is not None else None
+        if position is not None and position['seq'] != last_seq:
+            yield position_event(request_row, position, state, status)
+
+        while loop.time() - started < STREAM_MAX_SECONDS:
+            await asyncio.sleep(STREAM_POLL_SECONDS)
+            now = loop.time()
+            if now >= next_refresh:
+                next_refresh = now + STREAM_REFRESH_SECONDS
+                request_row = await sync_to_async(refreshed_request)(service_request.id)
+                status = request_row.status if request_row else None
+                if status not in ACTIVE_STATUSES:
+                    yield f"event: status\ndata: {json.dumps({'status': status})}\n\n"
+                    return
+                stored = tracking.stored_position(request_row)
+
+            position = tracking.latest_position(await tracking.aget_position(mechanic_id), stored)
+            state = await tracking.aget_request_state(service_request.id)
+            # Only ever move forward: the cache and the stored row can each lag the other
+            if position is not None and (version is None or event_version(position, state) > version):
+                version = event_version(position, state)
+                last_sent = now
+                yield position_event(request_row, position, state, status)
+            elif now - last_sent >= STREAM_HEARTBEAT_SECONDS:
+                last_sent = now
+                yield ": keep-alive\n\n"
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Stop nginx from buffering the stream
+    return response
@@ -0,0 +1,61 @@
+"""
+Shape-preserving downsampling of mechanic trajectories.
+
+Douglas-Peucker is run once to give every point a significance: the deviation (in metres) at
+which the algorithm would keep it. Simplifying to a tolerance or to a maximum number of points
+is then a cheap selection over those values instead of rerunning the algorithm.
+"""
+import numpy as np
+
+from .distance import EARTH_RADIUS_KM
+
+
+def project_metres(lats, lngs):
+    """Equirectangular projection around the track's mean latitude; accurate enough for a trip."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    metres_per_radian = EARTH_RADIUS_KM * 1000
+    x = np.radians(lngs) * np.cos(np.radians(lats.mean())) * metres_per_radian
+    y = np.radians(lats) * metres_per_radian
+    return x, y
+
+
+def significance(lats, lngs):
+    """Douglas-Peucker significance of each point in metres; the endpoints are infinitely significant."""
+    count = len(lats)
+    result = np.zeros(count)
+    if count == 0:
+        return result
+    result[0] = result[-1] = np.inf
+    if count < 3:
+        return result
+    x, y = project_metres(lats, lngs)
+
+    stack = [(0, count - 1, np.inf)]
+    while stack:
+        start, end, parent = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            deviation = np.hypot(px, py)
+        else:
+            deviation = np.abs(dx * py - dy * px) / length
+        split = start + 1 + int(np.argmax(deviation))
+        # A point is never more significant than the segment split that exposed it
+        value = min(float(deviation[split - start - 1]), parent)
+        result[split] = value
+        stack.append((start, split, value))
+        stack.append((split, end, value))
+    return result
+
+
+def simplify(lats, lngs, tolerance_m=0.0, max_points=None):
+    """Returns the sorted indexes of the points kept, honouring both the tolerance and max_points."""
+    scores = significance(lats, lngs)
+    keep = np.flatnonzero(scores > tolerance_m) if tolerance_m > 0 else np.arange(len(scores))
+    if max_points is not None and len(keep) > max_points:
+        keep = np.sort(keep[np.argsort(-scores[keep], kind='stable')[:max(max_points, 2)]])
+    return keep
@@ -0,0 +1,62 @@
+"""
+Denormalized unread-notification counts.
+
+User.unread_notifications is what the navbar badge shows, read from the already loaded
+request.user, so rendering a page costs no count query. Creating a notification increments it
+(Notification.save and Notification.bulk_create_notifications) and mark_read() decrements it by
+the number of notifications it actually flipped. reconcile(), run periodically by the
+reconcile_unread_counts command, recounts from the notifications table to correct any drift.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Notification, User
+
+
+def mark_read(user, notification_ids=None):
+    """
+    Marks the user's listed notifications read, or all of them when notification_ids is None,
+    with one UPDATE. Returns how many were unread.
+    """
+    notifications = Notification.objects.filter(recipient=user, read=False)
+    if notification_ids is not None:
+        notifications = notifications.filter(id__in=notification_ids)
+    changed = notifications.update(read=True)
+    if changed:
+        User.objects.filter(pk=user.pk).update(unread_notifications=Greatest(F('unread_notifications') - changed, 0))
+        user.unread_notifications = max(user.unread_notifications - changed, 0)
+    return changed
+
+
+def recount(user_id):
+    """
+    Stores the user's unread count recounted from the table. Returns True when it had drifted.
+
+    The user row is locked before counting: a notification committed earlier is in the count,
+    and the F() increment of one committed later waits for the lock and lands on top of it.
+    """
+    with transaction.atomic():
+        stored = User.objects.select_for_update().filter(pk=user_id).values_list('unread_notifications', flat=True).first()
+        if stored is None:
+            return False
+        actual = Notification.objects.filter(recipient_id=user_id, read=False).count()
+        if stored == actual:
+            return False
+        User.objects.filter(pk=user_id).update(unread_notifications=actual)
+        return True
+
+
+def reconcile():
+    """Corrects every stored count that differs from the table. Returns the number of users fixed."""
+    counts = dict(
+        Notification.objects.filter(read=False).values('recipient_id')
+        .annotate(unread=Count('id')).values_list('recipient_id', 'unread')
+    )
+    # Unlocked first pass to find the candidates; recount() settles each one under a lock
+    drifted = [
+        user_id
+        for user_id, stored in User.objects.values_list('id', 'unread_notifications').iterator(chunk_size=5000)
+        if stored != counts.get(user_id, 0)
+    ]
+    return sum(recount(user_id) for user_id in drifted)
@@ -1,5 +1,5 @@
 from django.urls import path, reverse_lazy
-from . import views, notification_views
+from . import views, notification_views, tracking_views
 from .views import sos_call
 from django.contrib.auth import views as auth_views
 
@@ -20,6 +20,9 @@ urlpatterns = [
     path('service-request/<int:service_request_id>/nearby-mechanics/', views.find_nearby_mechanics, name='find_nearby_mechanics'),
     path('notifications/', notification_views.notifications_list, name='notifications'),
     path('notifications/<int:notification_id>/mark-read/', notification_views.mark_notification_read, name='mark_notification_read'),
+    path('notifications/mark-read/', notification_views.mark_notifications_read, name='mark_notifications_read'),
+    path('notifications/mark-all-read/', notification_views.mark_all_notifications_read, name='mark_all_notifications_read'),
+    path('api/notifications/', notification_views.notifications_feed, name='notifications_feed'),
     
     # Password Reset URLs
     path('password-reset/', views.password_reset_request, name='password_reset'),
@@ -39,8 +42,11 @@ urlpatterns = [
     path('api/emergency/<int:emergency_request_id>/accept/', views.accept_emergency_request, name='accept_emergency_request'), # New API endpoint
     path('api/mechanic/update-availability/', views.update_mechanic_availability, name='update_mechanic_availability'),
     path('api/mechanic/update-location/', views.update_mechanic_location, name='update_mechanic_location'),
+    path('api/mechanic/locations/batch/', views.upload_mechanic_locations_batch, name='upload_mechanic_locations_batch'),
     path('api/mechanic/<int:mechanic_id>/details/', views.mechanic_details, name='mechanic_details'),
+    path('api/service-request/<int:service_request_id>/nearest-mechanics/', views.nearest_mechanics_api, name='nearest_mechanics'),
     path('api/service-request/<int:service_request_id>/mechanic-location/', views.get_mechanic_location_for_service_request, name='get_mechanic_location_for_service_request'),
+    path('api/service-request/<int:service_request_id>/mechanic-location/stream/', tracking_views.mechanic_location_stream, name='mechanic_location_stream'),
     
     # Mechanic Dashboard
     path('schedule/', views.mechanic_schedule, name='schedule'),
@@ -1,27 +1,40 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_datetime
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q, Avg, Sum, Count
 from django.db.models.functions import TruncDay
 from decimal import Decimal
-from .models import User, Mechanic, ServiceRequest, Review, Payment, Notification, Vehicle, EmergencyRequest
+from .models import User, Mechanic, ServiceRequest, Review, Payment, Vehicle, EmergencyRequest
 from django.contrib.auth.forms import UserCreationForm
 from django import forms
-from math import radians, sin, cos, sqrt, atan2
 from .notification_views import get_unread_notifications_count
+from .matching import nearest_mechanics, best_mechanics, best_mechanics_with_radius, DEFAULT_NEAREST_COUNT, MAX_SEARCH_RADIUS_KM
+from . import registry as mechanic_registry
+from . import geocoding
+from . import ranking
+from . import eta
+from . import location_ingest
+from . import tracking
+from . import trajectory
+from . import retention
+from . import trace_store
+from . import outbox
+from . import fanout
+from .cursors import encode_cursor, decode_cursor
 from .forms import ReviewForm, UserProfileForm, MechanicProfileForm # Add UserProfileForm, MechanicProfileForm
 from django.conf import settings
 from django.http import JsonResponse, HttpResponse # Added HttpResponse
 import json
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import login as auth_login
 from django.contrib.auth import logout
 from django.contrib.auth.forms import AuthenticationForm
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
 from django.views.decorators.csrf import csrf_exempt # Added import for csrf_exempt
 import googlemaps # Import googlemaps library
 from django.contrib.auth.forms import PasswordResetForm
@@ -31,68 +44,6 @@ from django.utils import translation # Import translation module
 from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from django.urls import reverse # Import reverse for URL lookups
-import io
-from xhtml2pdf import pisa
-def send_payment_receipt_email(payment):
-    service_request = payment.service_request
-    receipt_url = settings.BASE_URL + reverse('core:payment_receipt', args=[payment.id]) # Assuming BASE_URL is set in settings
-
-    subject = f"MechResQ Payment Receipt for Service Request #{service_request.id}"
-    html_message = render_to_string('emails/payment_receipt_email.html', {
-        'payment': payment,
-        'service_request': service_request,
-        'receipt_url': receipt_url,
-        'base_url': settings.BASE_URL,
-        'current_year': timezone.now().year,
-    })
-    plain_message = f"""
-    Dear {service_request.user.username},
-
-    Thank you for using MechResQ! Your payment for service request #{service_request.id} has been successfully processed.
-
-    Payment Details:
-    Service Request ID: {service_request.id}
-    Mechanic: {service_request.mechanic.user.get_full_name() if service_request.mechanic else 'N/A'}
-    Vehicle: {service_request.vehicle.make if service_request.vehicle else 'N/A'} {service_request.vehicle.model if service_request.vehicle else ''} ({service_request.vehicle.license_plate if service_request.vehicle else ''})
-    Issue: {service_request.issue_description}
-    Service Charge: Rs.{payment.service_charge}
-    Tax (18% GST): Rs.{payment.tax}
-    Total Amount Paid: Rs.{payment.total_amount}
-    Payment Method: {payment.get_payment_method_display()}
-    Transaction ID: {payment.transaction_id}
-    Paid At: {payment.paid_at}
-
-    You can view your full receipt here: {receipt_url}
-
-    Thank you,
-    The MechResQ Team
-    """
-    
-    try:
-        email = EmailMessage(
-            subject,
-            html_message,
-            settings.DEFAULT_FROM_EMAIL,
-            [service_request.user.email],
-        )
-        email.content_subtype = "html"
-        pdf_html = render_to_string('service/payment_receipt_pdf.html', {
-            'payment': payment,
-            'service_request': service_request,
-            'base_url': settings.BASE_URL,
-            'current_year': timezone.now().year,
-        })
-        pdf_buffer = io.BytesIO()
-        pisa.CreatePDF(pdf_html, dest=pdf_buffer)
-        pdf_data = pdf_buffer.getvalue()
-        pdf_buffer.close()
-        email.attach(f"payment_receipt_{payment.id}.pdf", pdf_data, 'application/pdf')
-        email.send()
-        return True
-    except Exception as e:
-        print(f'Failed to send payment receipt email: {e}')
-        return False
-
 def password_reset_request(request):
     if request.method == 'POST':
         form = PasswordResetForm(request.POST)
@@ -176,7 +127,7 @@ def password_reset_new_password(request):
                     return redirect('core:password_reset')
                 user.set_password(new_password)
                 user.save()
-                Notification.create_password_changed_notification(user)
+                outbox.notify('password_changed', user)
                 # Clear session data
                 del request.session['otp']
                 del request.session['email']
@@ -206,45 +157,17 @@ def create_emergency_request(request):
             if not latitude or not longitude:
                 return JsonResponse({'success': False, 'error': 'Location data missing.'}, status=400)
 
-            # Create the emergency request
-            emergency_request = EmergencyRequest.objects.create(
+            # Create the emergency request; nearby mechanics are alerted in rings by the
+            # escalate_emergencies scheduler so the SOS call returns immediately
+            EmergencyRequest.objects.create(
                 user=request.user,
                 latitude=latitude,
                 longitude=longitude,
-                status='PENDING'
+                status='PENDING',
+                next_escalation_at=timezone.now()
             )
 
-            # Find nearby mechanics (within a certain radius, e.g., 50 km)
-            nearby_mechanics = []
-            all_mechanics = Mechanic.objects.filter(available=True)
-            user_location = (latitude, longitude)
-
-            for mechanic in all_mechanics:
-                if mechanic.latitude and mechanic.longitude:
-                    mechanic_location = (mechanic.latitude, mechanic.longitude)
-                    distance = geodesic(user_location, mechanic_location).km
-                    if distance <= 50:  # 50 km radius
-                        nearby_mechanics.append(mechanic)
-                        
-                        # Create notification for nearby mechanic
-                        Notification.objects.create(
-                            recipient=mechanic.user,
-                            notification_type='EMERGENCY',
-                            title=f"New Emergency Request from {request.user.username}",
-                            message=f"An emergency request has been placed at {latitude}, {longitude}. Distance: {round(distance, 2)} km."
-                        )
-            
-            if not nearby_mechanics:
-                # Notify user if no mechanics are found
-                Notification.objects.create(
-                    recipient=request.user,
-                    notification_type='STATUS_UPDATE',
-                    title="Emergency Request Received",
-                    message="Your emergency request has been received, but no nearby mechanics are currently available. We are expanding our search."
-                )
-                return JsonResponse({'success': True, 'message': 'Emergency request created. No nearby mechanics found yet.'})
-
-            return JsonResponse({'success': True, 'message': 'Emergency request created and nearby mechanics notified.'})
+            return JsonResponse({'success': True, 'message': 'Emergency request created. Nearby mechanics are being notified.'})
 
         except json.JSONDecodeError:
             return JsonResponse({'success': False, 'error': 'Invalid JSON.'}, status=400)
@@ -278,8 +201,9 @@ def register_user(request):
             user = form.save(commit=False)
             user.phone_number = form.cleaned_data['phone_number']
             user.address = form.cleaned_data['address']
-            user.save()
-            Notification.create_welcome_notification(user)
+            with transaction.atomic():
+                user.save()
+                outbox.notify('welcome', user)
             messages.success(request, 'Registration successful! Please login to continue.')
             return redirect('core:login')
         else:
@@ -298,10 +222,13 @@ def register_mechanic(request):
             user = user_form.save(commit=False)
             user.is_mechanic = True
             user.save()
-            Notification.create_welcome_notification(user)
+            outbox.notify('welcome', user)
             mechanic = mechanic_form.save(commit=False)
             mechanic.user = user
             mechanic.save()
+            # Derives vehicle_types and rank_score, then publishes to the registry
+            ranking.update_score(mechanic)
+            geocoding.enqueue_mechanic(mechanic)
             messages.success(request, 'Mechanic registration successful! Please login to continue.')
             return redirect('core:login')
         else:
@@ -330,16 +257,29 @@ def create_service_request(request):
             service_request = form.save(commit=False)
             service_request.user = request.user
             
-            # Calculate estimated cost
-            mechanic = Mechanic.objects.filter(available=True).first() # Find an available mechanic
-            if mechanic:
-                base_fee = mechanic.base_fee
+            # Calculate estimated cost from the nearest available mechanic's base fee
+            base_fee = None
+            if service_request.latitude is not None and service_request.longitude is not None:
+                nearest, _ = nearest_mechanics(service_request.latitude, service_request.longitude, k=1, max_km=100, available_only=True)
+                if nearest:
+                    entry = mechanic_registry.get_entries([nearest[0][0]]).get(nearest[0][0])
+                    if entry:
+                        base_fee = Decimal(entry['base_fee'])
+            if base_fee is None:
+                mechanic = Mechanic.objects.filter(available=True).first() # Find an available mechanic
+                if mechanic:
+                    base_fee = mechanic.base_fee
+            if base_fee is not None:
                 issue_length = len(service_request.issue_description.split())
                 estimated_cost = base_fee + (issue_length * 2) # Add Rs.2 for each word in the issue description
                 service_request.estimated_cost = estimated_cost
             
-            service_request.save()
-            Notification.create_service_request_notification(recipient=request.user, service_request=service_request)
+            with transaction.atomic():
+                service_request.save()
+                geocoding.enqueue_service_request(service_request)
+                outbox.notify('service_request', request.user, service_request=service_request)
+                # Offer the request to the best-placed mechanics once it is committed
+                transaction.on_commit(lambda: fanout.notify_mechanics(service_request))
             messages.success(request, 'Request Created Successfully — Your service request has been created successfully.')
             messages.info(request, f'Estimated Cost — The estimated cost is Rs.{service_request.estimated_cost}.')
             return redirect('core:service_request_detail', pk=service_request.pk)
@@ -372,8 +312,8 @@ def dashboard(request):
         
         # Get emergency requests for the mechanic
         emergency_requests = EmergencyRequest.objects.filter(
-            Q(mechanic=mechanic) | Q(mechanic__isnull=True, status='PENDING')
-        ).order_by('-created_at')
+            Q(mechanic=mechanic) | Q(mechanic__isnull=True, status='PENDING', notified_mechanics=mechanic)
+        ).distinct().order_by('-created_at')
 
         # Get last 30 days service trend
         today = timezone.now()
@@ -434,6 +374,7 @@ def dashboard(request):
                 'mechanic_latitude': mechanic.latitude,
                 'mechanic_longitude': mechanic.longitude,
                 'status': active_mechanic_service_request.status,
+                **tracking.tracking_fields(active_mechanic_service_request, None, tracking.get_request_state(active_mechanic_service_request.id)),
             }
 
         return render(request, 'dashboard/mechanic.html', context)
@@ -464,6 +405,7 @@ def dashboard(request):
                 'mechanic_latitude': active_tracking_request.mechanic_latitude,
                 'mechanic_longitude': active_tracking_request.mechanic_longitude,
                 'status': active_tracking_request.status,
+                **tracking.tracking_fields(active_tracking_request, None, tracking.get_request_state(active_tracking_request.id)),
             }
         
         return render(request, 'dashboard/user.html', context)
@@ -489,16 +431,19 @@ def service_request_detail(request, pk):
                 # Set mechanic's current location to service request
                 service_request.mechanic_latitude = mechanic.latitude
                 service_request.mechanic_longitude = mechanic.longitude
+                service_request.accepted_at = timezone.now()
                 service_request.save()
+                ranking.record_acceptance(mechanic, service_request)
                 messages.success(request, 'Request Accepted Successfully — You have accepted the service request. Contact the user to confirm details.')
             
             elif action == 'start' and service_request.status == 'ACCEPTED':
                 service_request.status = 'IN_PROGRESS'
-                service_request.save()
+                service_request.save(update_fields=['status', 'updated_at'])
                 messages.success(request, 'Heading to User’s Location — You’re now marked as en route to the user’s location.')
             
             elif action == 'complete' and service_request.status == 'IN_PROGRESS':
                 service_request.mark_as_completed()  # This method will create the payment
+                ranking.record_completion(mechanic)
                 messages.success(request, 'Service Completed Successfully — You have marked this service as completed.')
             
             return redirect('core:service_request_detail', pk=service_request.pk)
@@ -549,6 +494,8 @@ def service_request_detail(request, pk):
         'active_page': 'service_requests',
         'google_maps_api_key': settings.GOOGLE_MAPS_API_KEY,
         'service_request_data_json': json.dumps(service_request_data_dict), # Pass as JSON string
+        'tracking_stream_url': reverse('core:mechanic_location_stream', args=[service_request.id]) if settings.MECHANIC_TRACKING_SSE else '',
+        'location_long_poll_seconds': min(settings.MECHANIC_LOCATION_LONG_POLL_SECONDS, MAX_LOCATION_WAIT_SECONDS),
     })
 
 @login_required
@@ -565,16 +512,13 @@ def submit_review(request, service_request_id):
         if form.is_valid():
             review = form.save(commit=False)
             review.service_request = service_request
-            review.save()
-            
-            # Update mechanic's rating
             mechanic = service_request.mechanic
-            reviews = Review.objects.filter(service_request__mechanic=mechanic)
-            avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
-            mechanic.rating = round(avg_rating, 2) if avg_rating else 0
-            mechanic.save()
-            Notification.create_feedback_submitted_notification(request.user)
-            Notification.create_rating_updated_notification(mechanic)
+            with transaction.atomic():
+                review.save()
+                # Update mechanic's rating and ranking score incrementally
+                ranking.record_review(mechanic, review.rating)
+                outbox.notify('feedback_submitted', request.user)
+                outbox.notify('rating_updated', mechanic=mechanic)
             
             messages.success(request, 'Thank you! Your review has been submitted successfully.')
             return redirect('core:service_request_detail', pk=service_request_id)
@@ -587,15 +531,6 @@ def submit_review(request, service_request_id):
     })
 
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    R = 6371  # Earth's radius in kilometers
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    return R * c
-
 @login_required
 def find_nearby_mechanics(request, service_request_id):
     service_request = get_object_or_404(ServiceRequest, pk=service_request_id)
@@ -607,114 +542,32 @@ def find_nearby_mechanics(request, service_request_id):
 
     # Ensure service request has valid coordinates
     if service_request.latitude is None or service_request.longitude is None:
-        messages.error(request, 'Service request location is not valid. Cannot find nearby mechanics.')
+        messages.error(request, 'Service request location is not valid yet. We are locating your address, please try again shortly.')
         return redirect('core:service_request_detail', pk=service_request_id)
 
-    nearby_mechanics = []
-    # Include all mechanics that have valid coordinates, regardless of availability
-    all_mechanics = Mechanic.objects.filter(latitude__isnull=False, longitude__isnull=False)
-    all_with_distance = []
-    
-    for mechanic in all_mechanics:
-        # Ensure latitude and longitude are floats for calculation
-        mechanic_lat = float(mechanic.latitude)
-        mechanic_lng = float(mechanic.longitude)
-        service_lat = float(service_request.latitude)
-        service_lng = float(service_request.longitude)
-
-        distance = calculate_distance(
-            service_lat,
-            service_lng,
-            mechanic_lat,
-            mechanic_lng
-        )
-        
-        print(f"Mechanic: {mechanic.user.username}, Lat: {mechanic_lat}, Lng: {mechanic_lng}, Distance to SR: {distance:.2f} km") # Debug print
+    service_lat = float(service_request.latitude)
+    service_lng = float(service_request.longitude)
 
-        # Track all with distance for fallback
-        all_with_distance.append((mechanic, distance))
+    # Include all mechanics that have valid coordinates, regardless of availability.
+    # Candidates come from the per-cell cache and are ordered by distance, rating, experience,
+    # responsiveness and specialization for this vehicle type.
+    ranked = best_mechanics(service_lat, service_lng, k=DEFAULT_NEAREST_COUNT, vehicle_type=service_request.vehicle_type)
+
+    mechanics_by_id = Mechanic.objects.select_related('user').in_bulk([mechanic_id for mechanic_id, _ in ranked])
+    # ETAs for every listed mechanic come from the local speed grid in one pass
+    eta_by_id = eta.eta_for_mechanics(service_lat, service_lng, [
+        {'id': mechanic.id, 'lat': mechanic.latitude, 'lng': mechanic.longitude} for mechanic in mechanics_by_id.values()
+    ])
+    nearby_mechanics = [
+        {
+            'mechanic': mechanics_by_id[mechanic_id],
+            'distance': round(distance, 2),
+            'eta_minutes': round(eta_by_id[mechanic_id])
+        }
+        for mechanic_id, distance in ranked
+        if mechanic_id in mechanics_by_id
+    ]
 
-        if distance <= 50:  # Within 50km radius
-            nearby_mechanics.append({
-                'mechanic': mechanic,
-                'distance': round(distance, 2)
-            })
-    
-    # Sort base list by distance (within-radius mechanics first)
-    nearby_mechanics.sort(key=lambda x: x['distance'])
-
-    # If we have only a few mechanics within 50 km, supplement with the next closest ones
-    # so the user can still see more options.
-    desired_min_count = 10
-    if len(nearby_mechanics) < desired_min_count and all_with_distance:
-        all_with_distance.sort(key=lambda t: t[1])
-
-        # Avoid adding duplicates of mechanics already in nearby_mechanics
-        existing_ids = {entry['mechanic'].id for entry in nearby_mechanics}
-        extra = []
-        for (m, d) in all_with_distance:
-            if m.id in existing_ids:
-                continue
-            extra.append({
-                'mechanic': m,
-                'distance': round(d, 2)
-            })
-            if len(nearby_mechanics) + len(extra) >= desired_min_count:
-                break
-
-        nearby_mechanics.extend(extra)
-        
-        # Secondary fallback: if we still have no coordinates to calculate distances
-        if not nearby_mechanics and len(all_with_distance) == 0:
-            # Try with all mechanics (ignore availability) that have coordinates
-            any_mechanics_with_coords = Mechanic.objects.filter(latitude__isnull=False, longitude__isnull=False)
-            any_with_distance = []
-            for m in any_mechanics_with_coords:
-                try:
-                    d = calculate_distance(float(service_request.latitude), float(service_request.longitude), float(m.latitude), float(m.longitude))
-                    any_with_distance.append((m, d))
-                except Exception:
-                    continue
-            any_with_distance.sort(key=lambda t: t[1])
-            fallback_any = any_with_distance[:10]
-            nearby_mechanics = [
-                {
-                    'mechanic': m,
-                    'distance': round(d, 2)
-                }
-                for (m, d) in fallback_any
-            ]
-
-        # Tertiary fallback: attempt light geocoding for a few mechanics missing coords
-        if not nearby_mechanics:
-            try:
-                geolocator = Nominatim(user_agent="mechresq-app")
-                mechanics_missing = Mechanic.objects.filter(Q(latitude__isnull=True) | Q(longitude__isnull=True)).exclude(workshop_address__isnull=True).exclude(workshop_address__exact='')[:5]
-                geocoded = []
-                for m in mechanics_missing:
-                    try:
-                        loc = geolocator.geocode(m.workshop_address, timeout=5)
-                        if loc:
-                            m.latitude = loc.latitude
-                            m.longitude = loc.longitude
-                            m.save(update_fields=['latitude', 'longitude'])
-                            d = calculate_distance(float(service_request.latitude), float(service_request.longitude), float(m.latitude), float(m.longitude))
-                            geocoded.append((m, d))
-                    except Exception:
-                        continue
-                geocoded.sort(key=lambda t: t[1])
-                fallback_geo = geocoded[:10]
-                if fallback_geo:
-                    nearby_mechanics = [
-                        {
-                            'mechanic': m,
-                            'distance': round(d, 2)
-                        }
-                        for (m, d) in fallback_geo
-                    ]
-            except Exception:
-                pass
-    
     # Initialize Google Maps client
     gmaps = None
     
@@ -728,11 +581,13 @@ def find_nearby_mechanics(request, service_request_id):
     # Prepare mechanics data for JavaScript
     mechanics_json = json.dumps([
         {
+            'id': m['mechanic'].id,
             'lat': float(m['mechanic'].latitude),
             'lng': float(m['mechanic'].longitude),
             'name': m['mechanic'].user.get_full_name() or m['mechanic'].user.username,
             'specialization': m['mechanic'].specialization,
-            'distance': m['distance']
+            'distance': m['distance'],
+            'eta_minutes': m['eta_minutes']
         } for m in nearby_mechanics
     ])
 
@@ -747,6 +602,54 @@ def find_nearby_mechanics(request, service_request_id):
         'google_maps_api_key': settings.GOOGLE_MAPS_API_KEY
     })
 
+@login_required
+def nearest_mechanics_api(request, service_request_id):
+    service_request = get_object_or_404(ServiceRequest, pk=service_request_id)
+
+    if not (request.user == service_request.user or
+            (hasattr(request.user, 'mechanic') and service_request.mechanic == request.user.mechanic)):
+        return JsonResponse({'success': False, 'error': 'Permission denied.'}, status=403)
+
+    if service_request.latitude is None or service_request.longitude is None:
+        return JsonResponse({'success': False, 'error': 'Service request location is not valid.'}, status=400)
+
+    try:
+        k = int(request.GET.get('k', DEFAULT_NEAREST_COUNT))
+        max_km = float(request.GET.get('max_km', MAX_SEARCH_RADIUS_KM))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'k and max_km must be numbers.'}, status=400)
+    if not (1 <= k <= 50) or not (0 < max_km <= MAX_SEARCH_RADIUS_KM):
+        return JsonResponse({'success': False, 'error': f'k must be 1-50 and max_km must be in (0, {MAX_SEARCH_RADIUS_KM}].'}, status=400)
+
+    # The same ranking as the list on the nearby-mechanics page, so its markers match the list
+    ranked, radius_km = best_mechanics_with_radius(
+        float(service_request.latitude), float(service_request.longitude), k=k,
+        vehicle_type=service_request.vehicle_type, max_km=max_km,
+    )
+    mechanics_by_id = Mechanic.objects.select_related('user').in_bulk([mechanic_id for mechanic_id, _ in ranked])
+    eta_by_id = eta.eta_for_mechanics(service_request.latitude, service_request.longitude, [
+        {'id': mechanic.id, 'lat': mechanic.latitude, 'lng': mechanic.longitude} for mechanic in mechanics_by_id.values()
+    ])
+
+    return JsonResponse({
+        'success': True,
+        'radius_km': radius_km,
+        'mechanics': [
+            {
+                'id': mechanic_id,
+                'lat': mechanics_by_id[mechanic_id].latitude,
+                'lng': mechanics_by_id[mechanic_id].longitude,
+                'name': mechanics_by_id[mechanic_id].user.get_full_name() or mechanics_by_id[mechanic_id].user.username,
+                'specialization': mechanics_by_id[mechanic_id].specialization,
+                'available': mechanics_by_id[mechanic_id].available,
+                'distance': round(distance, 2),
+                'eta_minutes': round(eta_by_id[mechanic_id]),
+            }
+            for mechanic_id, distance in ranked
+            if mechanic_id in mechanics_by_id
+        ],
+    })
+
 @login_required
 def mechanic_details(request, mechanic_id):
     mechanic = get_object_or_404(Mechanic, pk=mechanic_id)
@@ -910,13 +813,16 @@ def profile(request):
         if user_profile_form.is_valid():
             user_profile_form.save()
             if user.is_mechanic and mechanic_profile_form and mechanic_profile_form.is_valid():
-                mechanic_profile_form.save()
+                mechanic = mechanic_profile_form.save()
+                # The specialization may have changed; this also publishes to the registry
+                ranking.update_score(mechanic)
+                geocoding.enqueue_mechanic(mechanic)
             
             # Activate the newly selected language
             translation.activate(user.preferred_language)
             request.session['django_language'] = user.preferred_language
 
-            Notification.create_profile_updated_notification(user)
+            outbox.notify('profile_updated', user)
             messages.success(request, 'Profile updated successfully!')
             return redirect('core:profile')
         else:
@@ -1138,6 +1044,7 @@ def update_mechanic_availability(request):
         mechanic = request.user.mechanic
         mechanic.available = available
         mechanic.save()
+        mechanic_registry.publish(mechanic)
         
         return JsonResponse({'success': True})
     
@@ -1210,21 +1117,15 @@ def service_payment(request, service_id):
                 payment.payment_proof = payment_proof
             payment.payment_status = 'PAID'
             payment.paid_at = timezone.now()
-            
-            # Notify mechanic about payment completion
-            Notification.create_payment_notification(
-                recipient=service_request.mechanic.user,
-                payment=payment
-            )
-            messages.success(request, 'Payment completed successfully!')
-            
-            # Send payment receipt email to user
-            if send_payment_receipt_email(payment):
-                messages.success(request, 'Payment receipt sent to your email!')
-            else:
-                messages.error(request, 'Failed to send payment receipt email.')
-        
-        payment.save()
+            messages.success(request, 'Payment completed successfully! Your receipt will be emailed to you shortly.')
+
+        # The payment and its side effects are committed together; the outbox worker delivers them
+        with transaction.atomic():
+            payment.save()
+            if payment.payment_status == 'PAID':
+                # Notify mechanic about payment completion and email the receipt to the user
+                outbox.notify('payment', service_request.mechanic.user, payment=payment)
+                outbox.send_payment_receipt(payment)
         return redirect('core:service_request_detail', pk=service_id)
 
     context = {
@@ -1253,12 +1154,12 @@ def confirm_cash_payment(request, payment_id):
     if request.method == 'POST':
         payment.payment_status = 'PAID'
         payment.paid_at = timezone.now()
-        payment.save()
-        
-        # Notify user about payment confirmation
-        Notification.create_payment_notification(recipient=service_request.user, payment=payment)
-        Notification.create_invoice_generated_notification(recipient=service_request.user, payment=payment)
-        Notification.create_invoice_generated_notification(recipient=service_request.mechanic.user, payment=payment)
+        with transaction.atomic():
+            payment.save()
+            # Notify user about payment confirmation
+            outbox.notify('payment', service_request.user, payment=payment)
+            outbox.notify('invoice_generated', service_request.user, payment=payment)
+            outbox.notify('invoice_generated', service_request.mechanic.user, payment=payment)
         messages.success(request, 'Cash payment confirmed successfully!')
         return redirect('core:dashboard') # Redirect to mechanic dashboard
     
@@ -1396,27 +1297,15 @@ def process_payment(request, service_id):
         # Mark payment as completed
         payment.payment_status = 'PAID'
         payment.paid_at = timezone.now()
-        payment.save()
-        
-        # Notify mechanic about payment completion
-        Notification.create_payment_notification(
-            recipient=service_request.mechanic.user,
-            payment=payment
-        )
-        Notification.create_payment_notification(
-            recipient=service_request.user,
-            payment=payment
-        )
-        Notification.create_invoice_generated_notification(recipient=service_request.user, payment=payment)
-        Notification.create_invoice_generated_notification(recipient=service_request.mechanic.user, payment=payment)
-        
-        # Send payment receipt email to user
-        if send_payment_receipt_email(payment):
-            messages.success(request, 'Payment receipt sent to your email!')
-        else:
-            messages.error(request, 'Failed to send payment receipt email.')
-        
-        messages.success(request, 'Payment processed successfully!')
+        with transaction.atomic():
+            payment.save()
+            # Notify mechanic and user about payment completion and email the receipt
+            outbox.notify('payment', service_request.mechanic.user, payment=payment)
+            outbox.notify('payment', service_request.user, payment=payment)
+            outbox.notify('invoice_generated', service_request.user, payment=payment)
+            outbox.notify('invoice_generated', service_request.mechanic.user, payment=payment)
+            outbox.send_payment_receipt(payment)
+        messages.success(request, 'Payment processed successfully! Your receipt will be emailed to you shortly.')
         return redirect('core:service_request_detail', pk=service_id)
 
 @login_required
@@ -1435,18 +1324,12 @@ def assign_mechanic(request, service_request_id, mechanic_id):
     # Assign the mechanic, but keep the status as PENDING for mechanic to accept
     service_request.mechanic = mechanic
     # service_request.status remains 'PENDING'
-    service_request.save()
-
-    # Notify the selected mechanic about the new service request
-    Notification.create_service_request_notification(
-        recipient=mechanic.user,
-        service_request=service_request
-    )
-    # Notify the user that the mechanic has been notified
-    Notification.create_status_update_notification(
-        recipient=service_request.user,
-        service_request=service_request
-    )
+    with transaction.atomic():
+        service_request.save()
+        # Notify the selected mechanic about the new service request
+        outbox.notify('service_request', mechanic.user, service_request=service_request)
+        # Notify the user that the mechanic has been notified
+        outbox.notify('status_update', service_request.user, service_request=service_request)
     messages.success(request, f'Mechanic {mechanic.user.get_full_name()} has been notified about your service request. They will review it shortly.')
     return redirect('core:service_request_detail', pk=service_request.id) # Redirect back to service request detail page
 
@@ -1467,15 +1350,11 @@ def accept_emergency_request(request, emergency_request_id):
 
             emergency_request.mechanic = mechanic
             emergency_request.status = 'DISPATCHED'
-            emergency_request.save()
-
-            # Notify the user that a mechanic has accepted their request
-            Notification.objects.create(
-                recipient=emergency_request.user,
-                notification_type='STATUS_UPDATE',
-                title=f"Emergency Request Accepted by {mechanic.user.username}",
-                message=f"Mechanic {mechanic.user.username} is on their way to your emergency location."
-            )
+            emergency_request.next_escalation_at = None
+            with transaction.atomic():
+                emergency_request.save()
+                # Notify the user that a mechanic has accepted their request
+                outbox.notify('emergency_accepted', emergency_request.user, emergency_request=emergency_request)
 
             return JsonResponse({'success': True, 'message': 'Emergency request accepted.'})
         except Exception as e:
@@ -1498,27 +1377,9 @@ def update_mechanic_location(request):
             if latitude is None or longitude is None:
                 return JsonResponse({'success': False, 'error': 'Location data missing.'}, status=400)
 
-            mechanic = request.user.mechanic
-            mechanic.latitude = latitude
-            mechanic.longitude = longitude
-            mechanic.save()
-
-            # Save location to history
-            LocationHistory.objects.create(
-                mechanic=mechanic,
-                latitude=latitude,
-                longitude=longitude
-            )
-
-            # Update active service requests for this mechanic
-            active_service_requests = ServiceRequest.objects.filter(
-                mechanic=mechanic,
-                status__in=['ACCEPTED', 'IN_PROGRESS']
-            )
-            for sr in active_service_requests:
-                sr.mechanic_latitude = latitude
-                sr.mechanic_longitude = longitude
-                sr.save()
+            # Buffered: the mechanic row, location history and active service requests
+            # are written in batches by the ingest flusher
+            location_ingest.ingest(request.user.mechanic, latitude, longitude)
 
             return JsonResponse({'success': True, 'message': 'Mechanic location updated successfully.'})
         except json.JSONDecodeError:
@@ -1527,6 +1388,61 @@ def update_mechanic_location(request):
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
     return JsonResponse({'success': False, 'error': 'Invalid request method.'}, status=405)
 
+MAX_BATCH_FIXES = 500
+# Client clocks drift; fixes further in the future than this are rejected
+MAX_FIX_CLOCK_SKEW = timedelta(minutes=2)
+
+def parse_fix_timestamp(value):
+    """Accepts epoch milliseconds (as sent by the Geolocation API) or an ISO 8601 string."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+    return None
+
+@login_required
+@csrf_exempt
+def upload_mechanic_locations_batch(request):
+    if not request.user.is_mechanic:
+        return JsonResponse({'success': False, 'error': 'Not a mechanic'}, status=403)
+
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON.'}, status=400)
+
+        raw_fixes = data.get('fixes') if isinstance(data, dict) else None
+        if not isinstance(raw_fixes, list) or not raw_fixes:
+            return JsonResponse({'success': False, 'error': 'fixes must be a non-empty list.'}, status=400)
+        if len(raw_fixes) > MAX_BATCH_FIXES:
+            return JsonResponse({'success': False, 'error': f'At most {MAX_BATCH_FIXES} fixes can be uploaded at once.'}, status=400)
+
+        latest_allowed = timezone.now() + MAX_FIX_CLOCK_SKEW
+        fixes = []
+        for index, fix in enumerate(raw_fixes):
+            try:
+                latitude = float(fix['latitude'])
+                longitude = float(fix['longitude'])
+                recorded_at = parse_fix_timestamp(fix['timestamp'])
+            except (KeyError, TypeError, ValueError, OverflowError, OSError):
+                recorded_at = None
+                latitude = longitude = None
+            if (recorded_at is None or recorded_at > latest_allowed
+                    or not (-90 <= latitude <= 90) or not (-180 <= longitude <= 180)):
+                return JsonResponse({'success': False, 'error': f'Fix {index} is invalid.'}, status=400)
+            fixes.append((latitude, longitude, recorded_at))
+
+        location_ingest.ingest_batch(request.user.mechanic, fixes)
+        return JsonResponse({'success': True, 'stored': len(fixes)})
+    return JsonResponse({'success': False, 'error': 'Invalid request method.'}, status=405)
+
+# Longest ?wait= a location poll may hold a worker for
+MAX_LOCATION_WAIT_SECONDS = 25
+
 @login_required
 def get_mechanic_location_for_service_request(request, service_request_id):
     service_request = get_object_or_404(ServiceRequest, pk=service_request_id)
@@ -1537,12 +1453,43 @@ def get_mechanic_location_for_service_request(request, service_request_id):
         return JsonResponse({'success': False, 'error': 'Permission denied.'}, status=403)
 
     if service_request.mechanic and (service_request.status == 'ACCEPTED' or service_request.status == 'IN_PROGRESS'):
-        return JsonResponse({
+        try:
+            wait = float(request.GET.get('wait', 0))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'wait must be a number of seconds.'}, status=400)
+        wait = min(max(wait, 0), MAX_LOCATION_WAIT_SECONDS)
+
+        position = tracking.current_position(service_request)
+        state = tracking.get_request_state(service_request.id)
+        etag = tracking.location_etag(service_request, position, state)
+        # Long-poll: a client that already has the latest position waits for the next one
+        if wait and etag in request.headers.get('If-None-Match', ''):
+            newer = tracking.wait_for_position(service_request.mechanic_id, position['seq'] if position else None, wait)
+            if newer is not None:
+                position = newer
+                state = tracking.get_request_state(service_request.id)
+                etag = tracking.location_etag(service_request, position, state)
+
+        last_modified = position['seq'] // 1000 if position else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        # Distance, speed and ETA are precomputed on location ingest, not per viewer
+        response = JsonResponse({
             'success': True,
-            'mechanic_latitude': service_request.mechanic_latitude,
-            'mechanic_longitude': service_request.mechanic_longitude,
-            'status': service_request.status
+            'mechanic_latitude': position['latitude'] if position else None,
+            'mechanic_longitude': position['longitude'] if position else None,
+            'status': service_request.status,
+            'arrived_at': service_request.arrived_at.isoformat() if service_request.arrived_at else None,
+            **tracking.tracking_fields(service_request, position, state),
         })
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Browsers must revalidate every time, which is what makes the 304s useful
+        response['Cache-Control'] = 'private, no-cache'
+        return response
     else:
         return JsonResponse({'success': False, 'error': 'Mechanic not assigned or service not in progress.'}, status=404)
 
@@ -1572,7 +1519,7 @@ def login_view(request):
                 translation.activate(user.preferred_language)
                 request.session['django_language'] = user.preferred_language
 
-                Notification.create_welcome_notification(user)
+                outbox.notify('welcome', user)
                 messages.success(request, f"Welcome {user.get_full_name() or user.username}! — Welcome back! We’re ready to assist you.")
                 return redirect('core:dashboard')
             else:
@@ -1583,7 +1530,20 @@ def login_view(request):
         form = AuthenticationForm()
     return render(request, 'registration/login.html', {'form': form})
 
-from .models import LocationHistory
+DEFAULT_HISTORY_WINDOW = timedelta(hours=24)
+DEFAULT_HISTORY_POINTS = 500
+MAX_HISTORY_POINTS = 5000
+DEFAULT_HISTORY_TOLERANCE_M = 5.0
+# Raw rows read per page; each page is simplified on its own
+HISTORY_PAGE_SIZE = 20000
+
+def parse_history_time(value):
+    if not value:
+        return None
+    parsed = parse_fix_timestamp(float(value) if value.replace('.', '', 1).isdigit() else value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
 
 @login_required
 def get_location_history(request, mechanic_id):
@@ -1600,15 +1560,42 @@ def get_location_history(request, mechanic_id):
         if not has_relation:
             return JsonResponse({'success': False, 'error': 'Permission denied.'}, status=403)
 
-    location_history = LocationHistory.objects.filter(mechanic=mechanic).order_by('-timestamp')
+    # Parse the time window and paging parameters
+    try:
+        until = parse_history_time(request.GET.get('until')) or timezone.now()
+        since = parse_history_time(request.GET.get('since')) or until - DEFAULT_HISTORY_WINDOW
+        max_points = int(request.GET.get('max_points', DEFAULT_HISTORY_POINTS))
+        tolerance_m = float(request.GET.get('tolerance_m', DEFAULT_HISTORY_TOLERANCE_M))
+        cursor = decode_cursor(request.GET.get('cursor'))
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Invalid since, until, max_points, tolerance_m or cursor.'}, status=400)
+    if since > until or not (2 <= max_points <= MAX_HISTORY_POINTS) or tolerance_m < 0:
+        return JsonResponse({'success': False, 'error': f'since must not be after until, max_points must be 2-{MAX_HISTORY_POINTS} and tolerance_m must not be negative.'}, status=400)
+
+    # Only the hot tier of raw points is served; older data lives in rollups and archives
+    since = max(since, retention.hot_tier_start())
+    # Packed hourly traces are decoded, raw rows are read only for hours not packed yet.
+    # Keyset paging: continue strictly after the last (timestamp, id) of the previous page
+    rows = trace_store.history_points(mechanic.id, since, until, after=cursor, limit=HISTORY_PAGE_SIZE + 1)
+    next_cursor = None
+    if len(rows) > HISTORY_PAGE_SIZE:
+        rows = rows[:HISTORY_PAGE_SIZE]
+        next_cursor = encode_cursor(rows[-1][3], rows[-1][0])
+
+    # Douglas-Peucker keeps the shape of the track within max_points
+    keep = trajectory.simplify([row[1] for row in rows], [row[2] for row in rows], tolerance_m, max_points) if rows else []
     data = {
         'success': True,
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'raw_points': len(rows),
+        'next_cursor': next_cursor,
         'location_history': [
             {
-                'latitude': lh.latitude,
-                'longitude': lh.longitude,
-                'timestamp': lh.timestamp.isoformat()
-            } for lh in location_history
+                'latitude': rows[index][1],
+                'longitude': rows[index][2],
+                'timestamp': rows[index][3].isoformat()
+            } for index in keep
         ]
     }
     return JsonResponse(data)
@@ -1640,7 +1627,7 @@ def custom_map_view(request):
 
 def logout_view(request):
     if request.user.is_authenticated:
-        Notification.create_logout_notification(request.user)
+        outbox.notify('logout', request.user)
         messages.success(request, "Logout Successful — You’ve logged out safely. See you again soon!")
     logout(request)
     return redirect('core:login')
@@ -174,6 +174,48 @@ MESSAGE_TAGS = {
     messages.ERROR: 'alert-danger',
 }
 
+# Live mechanic registry used for matching (see core/registry.py).
+# Use core.registry.CacheRegistry with a shared cache (Redis/Memcached) when running several workers.
+MECHANIC_REGISTRY = {
+    'BACKEND': env('MECHANIC_REGISTRY_BACKEND', default='core.registry.LocalMemoryRegistry'),
+    'REFRESH_SECONDS': env.int('MECHANIC_REGISTRY_REFRESH_SECONDS', default=60),
+}
+
+# Speed-zone grid used for offline ETAs, built by `python index.py build_speed_grid`
+ETA_SPEED_GRID_PATH = env('ETA_SPEED_GRID_PATH', default=str(BASE_DIR / 'data' / 'speed_grid.npz'))
+
+# Mechanic location pings are buffered and written in batches this often (0 writes every ping)
+LOCATION_INGEST_FLUSH_SECONDS = env.float('LOCATION_INGEST_FLUSH_SECONDS', default=5.0)
+
+# Live tracking positions are published to the default cache (see core/tracking.py). The default
+# local-memory cache is per process: with several workers, viewers see pings handled by another
+# worker only once the ingest flush has stored them. Configure a shared cache (Redis/Memcached)
+# in CACHES to serve every ping as soon as it arrives.
+
+# Push live mechanic positions to the request detail page over Server-Sent Events.
+# Needs the ASGI application (e.g. uvicorn/daphne); under WSGI the page keeps polling.
+MECHANIC_TRACKING_SSE = env.bool('MECHANIC_TRACKING_SSE', default=False)
+
+# When the page polls, it sends its last ETag every 10 seconds and gets a 304 if the mechanic has
+# not moved. A value above 0 makes each poll wait that many seconds on the server for the next
+# position instead. Every waiting viewer holds a thread, so only enable it under ASGI.
+MECHANIC_LOCATION_LONG_POLL_SECONDS = env.int('MECHANIC_LOCATION_LONG_POLL_SECONDS', default=0)
+
+# LocationHistory retention (see `python index.py apply_location_retention`): raw points are kept
+# for RAW_DAYS, per-minute rollups for MINUTE_DAYS and per-hour rollups after that. Expired raw
+# points are archived as gzip CSV files under ARCHIVE_DIR.
+LOCATION_RETENTION = {
+    'RAW_DAYS': env.int('LOCATION_RETENTION_RAW_DAYS', default=7),
+    'MINUTE_DAYS': env.int('LOCATION_RETENTION_MINUTE_DAYS', default=90),
+    'ARCHIVE_DIR': env('LOCATION_RETENTION_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'location_history')),
+}
+
+# A mechanic within this many metres of a service request's location counts as arrived
+ARRIVAL_RADIUS_M = env.float('ARRIVAL_RADIUS_M', default=150.0)
+
+# Push notification transport (see core.push); 'core.push.FakeTransport' records pushes instead of sending
+PUSH_TRANSPORT = env('PUSH_TRANSPORT', default='core.push.FirebaseTransport')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 